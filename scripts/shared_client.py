@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Interoperability ROS client sharing a single server session between
+components.
+
+Runs the obstacles, mission information, telemetry and targets components in
+one process with a single authenticated InteroperabilityClient, instead of
+one client per node.
+"""
+
+import rospy
+from interop.components import COMPONENTS, create_client
+
+
+if __name__ == "__main__":
+    # Initialize node.
+    rospy.init_node("interop")
+
+    # Check the requested components.
+    names = rospy.get_param("~components", sorted(COMPONENTS))
+    for name in names:
+        if name not in COMPONENTS:
+            rospy.logfatal("Unknown component: %s", name)
+            raise KeyError(name)
+
+    # Initialize the shared interoperability client, with enough pooled
+    # connections for every component.
+    client = create_client(names)
+
+    # Wait for server to be reachable, then login once for all components.
+    client.wait_for_server()
+    client.login()
+
+    # Load the requested components.
+    components = []
+    for name in names:
+        rospy.loginfo("Loading %s component", name)
+        components.append(COMPONENTS[name](client, name))
+
+    # Spin forever.
+    rospy.spin()
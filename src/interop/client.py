@@ -2,10 +2,201 @@
 
 """Interoperability HTTP Client."""
 
+import io
+import os
 import json
+import time
 import rospy
+import random
+import hashlib
+import socket
 import requests
+import threading
 import serializers
+from requests.adapters import HTTPAdapter
+
+
+class InactiveMissionError(LookupError):
+
+    """Raised when a mission that was active no longer is."""
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+
+    """HTTP adapter with configurable socket options for pooled connections.
+
+    Attributes:
+        socket_options: List of (level, option, value) tuples applied to every
+            new connection in the pool.
+    """
+
+    def __init__(self, socket_options, **kwargs):
+        """Initializes PooledHTTPAdapter.
+
+        Args:
+            socket_options: List of (level, option, value) tuples to set on
+                every new connection.
+            **kwargs: Arguments to HTTPAdapter.
+        """
+        self.socket_options = socket_options
+        super(PooledHTTPAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        """Initializes the pool manager with the socket options."""
+        kwargs["socket_options"] = self.socket_options
+        super(PooledHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+
+
+class ProgressReader(object):
+
+    """Request body wrapper reporting how much of it has been sent.
+
+    Strings and files are streamed with a known length, so that they are sent
+    with a Content-Length header, while iterators of chunks are sent with
+    chunked transfer encoding.
+    """
+
+    def __init__(self, body, progress, chunk_size=64 * 1024):
+        """Initializes ProgressReader.
+
+        Args:
+            body: String, file opened in binary mode, or iterator of string
+                chunks.
+            progress: Callable called with the number of bytes sent so far
+                and the total number of bytes (None if unknown).
+            chunk_size: Number of bytes to read from files at a time.
+        """
+        if isinstance(body, bytes):
+            body = io.BytesIO(body)
+
+        self.body = body
+        self.progress = progress
+        self.chunk_size = chunk_size
+        self.sent = 0
+        self.total = None
+
+        if hasattr(body, "read"):
+            # Length of the whole body, from which requests subtracts tell()
+            # to set the Content-Length header to the length left to read.
+            start = body.tell()
+            body.seek(0, os.SEEK_END)
+            self.len = body.tell()
+            self.total = self.len - start
+            body.seek(start)
+
+            # Allow rewinding, e.g. to send again after reauthenticating.
+            self._start = start
+            self.tell = body.tell
+            self.seek = self._seek
+
+    def __iter__(self):
+        """Yields the body in chunks, reporting progress."""
+        if hasattr(self.body, "read"):
+            chunks = iter(lambda: self.body.read(self.chunk_size), b"")
+        else:
+            chunks = self.body
+
+        for chunk in chunks:
+            self._update(len(chunk))
+            yield chunk
+
+    def read(self, size=-1):
+        """Reads from the body, reporting progress.
+
+        Args:
+            size: Maximum number of bytes to read, or -1 to read everything.
+
+        Returns:
+            The bytes read.
+        """
+        chunk = self.body.read(size)
+        self._update(len(chunk))
+        return chunk
+
+    def _seek(self, offset, whence=os.SEEK_SET):
+        """Moves to the given position in the body.
+
+        Args:
+            offset: Offset in bytes.
+            whence: Position the offset is relative to.
+        """
+        self.body.seek(offset, whence)
+        self.sent = self.body.tell() - self._start
+
+    def _update(self, n):
+        """Records that n more bytes were sent.
+
+        Args:
+            n: Number of bytes.
+        """
+        self.sent += n
+        self.progress(self.sent, self.total)
+
+
+class Backoff(object):
+
+    """Exponential backoff policy with jitter.
+
+    Each successive delay is multiplied until it reaches a cap, and is then
+    randomly shortened by up to a fraction of itself so that clients that
+    failed together do not all retry at once.
+
+    Attributes:
+        initial: First delay in seconds.
+        maximum: Maximum delay in seconds.
+        multiplier: Factor each delay grows by.
+        jitter: Fraction from 0 (none) to 1 (full) of each delay to randomly
+            shorten it by.
+        retries: Number of times transient login failures are retried before
+            giving up, or None to retry forever.
+    """
+
+    def __init__(self, initial=0.5, maximum=30.0, multiplier=2.0, jitter=0.5,
+                 retries=3):
+        """Initializes Backoff.
+
+        Args:
+            initial: First delay in seconds.
+            maximum: Maximum delay in seconds.
+            multiplier: Factor each delay grows by.
+            jitter: Fraction from 0 (none) to 1 (full) of each delay to
+                randomly shorten it by.
+            retries: Number of times transient login failures are retried
+                before giving up, or None to retry forever.
+        """
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retries = retries
+
+    def delays(self):
+        """Yields successive delays in seconds forever.
+
+        Every call starts over from the initial delay, so each retried
+        operation should use its own generator.
+        """
+        delay = self.initial
+        while True:
+            yield delay * (1 - self.jitter * random.random())
+            delay = min(delay * self.multiplier, self.maximum)
+
+    @staticmethod
+    def sleep(duration, step=0.1):
+        """Sleeps for the given duration, or until ROS shuts down.
+
+        Wall time is used rather than ROS time, so that this does not hang
+        when simulated time is not published.
+
+        Args:
+            duration: Duration in seconds.
+            step: Maximum time to sleep between shutdown checks in seconds.
+        """
+        end = time.time() + duration
+        remaining = duration
+        while remaining > 0 and not rospy.is_shutdown():
+            time.sleep(min(remaining, step))
+            remaining = end - time.time()
 
 
 class InteroperabilityClient(object):
@@ -16,9 +207,12 @@ class InteroperabilityClient(object):
         url: Base URL of the Interoperability server.
         session: Requests session.
         timeout: Timeout in seconds for individual requests.
+        backoff: Backoff policy between attempts to reach the server.
     """
 
-    def __init__(self, url, username, password, timeout):
+    def __init__(self, url, username, password, timeout, pool_connections=1,
+                 pool_maxsize=4, keep_alive=True, tcp_nodelay=True,
+                 projection=None, backoff=None):
         """Initializes InteroperabilityClient.
 
         Note: the client must wait_for_server() and login() to the server
@@ -29,6 +223,16 @@ class InteroperabilityClient(object):
             username: Interoperability server username.
             password: Interoperability server password.
             timeout: Timeout in seconds for individual requests.
+            pool_connections: Number of per-host connection pools to cache.
+            pool_maxsize: Maximum number of connections kept open per host.
+            keep_alive: Whether to enable TCP keep-alive probes on idle
+                pooled connections.
+            tcp_nodelay: Whether to disable Nagle's algorithm.
+            projection: serializers.UTMProjection to project every location
+                with, or None to use that of the last mission retrieved
+                with get_active_mission() or get_mission().
+            backoff: Backoff policy between attempts to reach the server,
+                login and reauthenticate, or None for the default one.
 
         Raises:
             Timeout: On timeout.
@@ -36,11 +240,42 @@ class InteroperabilityClient(object):
         """
         self.timeout = timeout
         self.url = url[:-1] if url.endswith('/') else url
+        self.backoff = backoff or Backoff()
+
+        # Shared by missions and obstacles so that they are in the same frame.
+        # Unless set, it follows the mission retrieved last.
+        self.projection = projection
+        self.__fixed_projection = projection is not None
+
+        # Set up a pooled transport that is reused for the lifetime of the
+        # client, including across reauthentications.
+        socket_options = [
+            (socket.IPPROTO_TCP, socket.TCP_NODELAY, int(tcp_nodelay)),
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, int(keep_alive))
+        ]
+        adapter = PooledHTTPAdapter(socket_options,
+                                    pool_connections=pool_connections,
+                                    pool_maxsize=pool_maxsize)
         self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
         # Set up credentials for login.
         self.__credentials = {"username": username, "password": password}
 
+        # Serializes reauthentication between concurrent requests, so that a
+        # burst of expired requests only logs in once.
+        self.__login_lock = threading.RLock()
+        self.__logins = 0
+
+        # Validators, content hashes and deserialized results of conditional
+        # GET requests, at most one per URI and purpose.
+        # {(uri, tag): (key, etag, last_modified, content_hash, result)}
+        self.__cache = {}
+
+        # ID of the last known active mission, or None if unknown.
+        self.__active_mission_id = None
+
     def __request(self, method, uri, **kwargs):
         """Sends request to Interoperability server at specified URI.
 
@@ -57,25 +292,52 @@ class InteroperabilityClient(object):
             HTTPError: On request failure.
             ConnectionError: On connection failure.
         """
-        # Try until authenticated.
+        # Remember where streamed request bodies start, so they can be
+        # rewound if the request needs to be sent again.
+        data = kwargs.get("data")
+        offset = data.tell() if hasattr(data, "seek") else None
+        rewindable = offset is not None or not (
+            hasattr(data, "__iter__") and
+            not isinstance(data, (bytes, str, dict, list, tuple)))
+
+        # Try until authenticated, backing off if the server keeps rejecting
+        # the renewed session.
+        delays = None
         while not rospy.is_shutdown():
             # Send request.
+            logins = self.__logins
+            if offset is not None:
+                data.seek(offset)
             response = self.session.request(
                 method=method,
                 url=self.url + (uri if uri.startswith('/') else '/' + uri),
                 timeout=self.timeout,
                 **kwargs)
 
-            # Relogin if session expired, and try again.
-            if response.status_code == requests.codes.FORBIDDEN:
-                rospy.logwarn("Session expired: reauthenticating...")
-
-                # Start a new session.
-                self.session.close()
-                self.session = requests.Session()
-
-                # Relogin.
-                self.login()
+            # Relogin if session expired, and try again. Bodies streamed from
+            # iterators cannot be sent again, so those fail instead.
+            if (response.status_code == requests.codes.FORBIDDEN and
+                    rewindable):
+                # Release the connection to the pool, even if the response
+                # was streamed.
+                response.close()
+
+                if delays is None:
+                    delays = self.backoff.delays()
+                else:
+                    self.backoff.sleep(next(delays))
+
+                with self.__login_lock:
+                    # Only relogin if no other request already did since.
+                    if logins == self.__logins:
+                        rospy.logwarn("Session expired: reauthenticating...")
+
+                        # Drop the expired session cookie, but keep the
+                        # pooled connections alive.
+                        self.session.cookies.clear()
+
+                        # Relogin.
+                        self.login()
                 continue
 
             # Notify of other errors.
@@ -103,6 +365,68 @@ class InteroperabilityClient(object):
         """
         return self.__request("GET", uri, **kwargs)
 
+    def _get_cached(self, uri, tag, key, deserialize):
+        """Sends conditional GET request to Interoperability server at
+        specified URI, and deserializes the response unless it did not change
+        since the last request.
+
+        The validators the server responded with and a hash of the response
+        body are remembered along with the deserialized result. The result is
+        returned as is if the server responds with 304 Not Modified, or with
+        the same body as last time, so it must not be modified.
+
+        Only the last result is remembered for each URI and tag, so that
+        results for outdated arguments do not pile up.
+
+        Args:
+            uri: Server URI to access.
+            tag: Name of what the result is used for, to remember different
+                results of the same URI separately.
+            key: Everything other than the response that the result depends
+                on. A cached result for a different key is ignored and
+                replaced.
+            deserialize: Callable that deserializes the decoded JSON response
+                into the result.
+
+        Returns:
+            The deserialized result.
+
+        Raises:
+            Timeout: On timeout.
+            HTTPError: On request failure.
+            ConnectionError: On connection failure.
+            JSONDecodeError: On JSON decoding failure.
+        """
+        cached = self.__cache.get((uri, tag))
+        if cached is not None and cached[0] != key:
+            cached = None
+
+        headers = {}
+        if cached is not None:
+            _, etag, last_modified, content_hash, result = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        response = self._get(uri, headers=headers)
+        if (response.status_code == requests.codes.NOT_MODIFIED and
+                cached is not None):
+            return result
+
+        # Not every server supports conditional requests, so also look for
+        # changes in the body itself.
+        new_hash = hashlib.sha1(response.content).digest()
+        if cached is None or new_hash != content_hash:
+            result = deserialize(response.json())
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        self.__cache[(uri, tag)] = (key, etag, last_modified, new_hash,
+                                    result)
+
+        return result
+
     def _put(self, uri, **kwargs):
         """Sends PUT request to Interoperability server at specified URI.
 
@@ -155,37 +479,75 @@ class InteroperabilityClient(object):
         return self.__request("DELETE", uri, **kwargs)
 
     def wait_for_server(self):
-        """Waits until interoperability server is reachable."""
-        reachable = False
-        while not reachable and not rospy.is_shutdown():
+        """Waits until interoperability server is reachable, backing off
+        between attempts."""
+        delays = self.backoff.delays()
+        while not rospy.is_shutdown():
             try:
                 response = requests.get(self.url, timeout=self.timeout)
                 response.raise_for_status()
-                reachable = response.ok
-            except:
-                continue
+                return
+            except requests.exceptions.RequestException as e:
+                delay = next(delays)
+                rospy.logdebug("Server unreachable, retrying in %.2f s: %s",
+                               delay, e)
+            self.backoff.sleep(delay)
 
     def login(self):
         """Authenticates with the server.
 
+        Timeouts, connection failures and server errors are retried with
+        backoff as many times as the backoff policy allows.
+
         Raises:
             Timeout: On timeout.
             HTTPError: On request failure.
             ConnectionError: On connection failure.
         """
-        response = self.session.request(
-            method="POST",
-            url=self.url + "/api/login",
-            timeout=self.timeout,
-            data=self.__credentials)
-        response.raise_for_status()
-
-    def get_obstacles(self, frame, lifetime):
+        with self.__login_lock:
+            delays = self.backoff.delays()
+            attempts = 0
+            while True:
+                try:
+                    response = self.session.request(
+                        method="POST",
+                        url=self.url + "/api/login",
+                        timeout=self.timeout,
+                        data=self.__credentials)
+                    response.raise_for_status()
+                    break
+                except (requests.exceptions.ConnectionError,
+                        requests.exceptions.Timeout,
+                        requests.exceptions.HTTPError) as e:
+                    # Rejected credentials will not get any better.
+                    transient = (
+                        not isinstance(e, requests.exceptions.HTTPError) or
+                        e.response.status_code >= 500)
+                    retries = self.backoff.retries
+                    if (not transient or rospy.is_shutdown() or
+                            retries is not None and attempts >= retries):
+                        raise
+
+                    attempts += 1
+                    delay = next(delays)
+                    rospy.logwarn("Login failed, retrying in %.2f s: %s",
+                                  delay, e)
+                    self.backoff.sleep(delay)
+
+            self.__logins += 1
+
+    def get_obstacles(self, frame, lifetime, deserializer=None):
         """Returns obstacles as Markers.
 
+        If the obstacles did not change since the last call, the same
+        Markers are returned without being deserialized again.
+
         Args:
             frame: Frame ID of every Marker.
             lifetime: Lifetime of every Marker in seconds.
+            deserializer: serializers.ObstaclesDeserializer to reuse the
+                Markers of, in which case frame and lifetime are ignored, or
+                None to return new Markers.
 
         Returns:
             Tuple of two visualization_msgs/MarkerArray.
@@ -198,9 +560,17 @@ class InteroperabilityClient(object):
             ConnectionError: On connection failure.
             JSONDecodeError: On JSON decoding failure.
         """
-        response = self._get("/api/obstacles")
-        return serializers.ObstaclesDeserializer.from_dict(response.json(),
-                                                           frame, lifetime)
+        projection = self.projection
+
+        def deserialize(data):
+            if deserializer is None:
+                return serializers.ObstaclesDeserializer.from_dict(
+                    data, frame, lifetime, projection)
+            return deserializer.deserialize(data, projection)
+
+        key = (frame, lifetime, deserializer, projection)
+        return self._get_cached("/api/obstacles", "obstacles", key,
+                                deserialize)
 
     def post_telemetry(self, navsat_msg, compass_msg):
         """Uploads telemetry information to Interoperability server.
@@ -272,6 +642,11 @@ class InteroperabilityClient(object):
     def get_active_mission(self, frame):
         """Gets active mission.
 
+        Once the active mission is known, only that mission is requested, and
+        all missions are only listed again once it is no longer active.
+        If the mission did not change since the last call, the same messages
+        are returned without being deserialized again.
+
         Args:
             frame: Frame ID.
 
@@ -287,20 +662,58 @@ class InteroperabilityClient(object):
             JSONDecodeError: On JSON decoding failure.
             LookupError: On no active missions found.
         """
-        response = self._get("/api/missions")
-        for m in response.json():
-            if m["active"]:
-                return serializers.MissionDeserializer.from_dict(m, frame)
-        raise LookupError("No active missions found")
+        key = (frame,)
+
+        # Fast path: revalidate the last known active mission.
+        mission_id = self.__active_mission_id
+        if mission_id is not None:
+            def deserialize_mission(m):
+                if not m["active"]:
+                    raise InactiveMissionError("Mission is no longer active")
+                return self.__deserialize_mission(m, frame)
+
+            uri = "/api/missions/{:d}".format(mission_id)
+            try:
+                return self.__select_mission(
+                    self._get_cached(uri, "active", key, deserialize_mission))
+            except InactiveMissionError as e:
+                # The mission is no longer active. Other errors, e.g. on
+                # malformed missions, are not hidden by listing them all.
+                rospy.logdebug(e)
+                self.__active_mission_id = None
+            except requests.exceptions.HTTPError as e:
+                # Other errors, e.g. transient server errors, are no reason
+                # to list every mission instead.
+                if e.response.status_code != requests.codes.NOT_FOUND:
+                    raise
+
+                # The mission no longer exists.
+                rospy.logdebug(e)
+                self.__active_mission_id = None
+
+        def deserialize(data):
+            for m in data:
+                if m["active"]:
+                    return m["id"], self.__deserialize_mission(m, frame)
+            raise LookupError("No active missions found")
+
+        mission_id, result = self._get_cached("/api/missions", "active", key,
+                                              deserialize)
+        self.__active_mission_id = mission_id
+        return self.__select_mission(result)
 
     def get_all_missions(self, frame):
         """Gets all missions.
 
+        If the missions did not change since the last call, the same messages
+        are returned without being deserialized again.
+
         Args:
             frame: Frame ID.
 
         Returns:
-            A list of tuples of (FlyZoneArray, PolygonStamped, Marker, PointStamped, PointStamped,
+            A dictionary of mission IDs to serializers.LazyMission, which
+            behave as tuples of (FlyZoneArray, PolygonStamped, Marker, PointStamped, PointStamped,
             Pointstamped) corresponding to the flyzones, search grid, waypoints, air drop position,
             off axis target location, and the emergent object location.
 
@@ -310,16 +723,25 @@ class InteroperabilityClient(object):
             ConnectionError: On connection failure.
             JSONDecodeError: On JSON decoding failure.
         """
-        response = self._get("/api/missions")
-        missions = {
-            m["id"]: serializers.MissionDeserializer.from_dict(m, frame)
-            for m in response.json()
-        }
-        return missions
+        projection = self.projection
+
+        # Only deserialize the fields of the missions that are used.
+        def deserialize(data):
+            return {
+                m["id"]: serializers.MissionDeserializer.from_dict_lazy(
+                    m, frame, projection)
+                for m in data
+            }
+
+        key = (frame, projection)
+        return self._get_cached("/api/missions", "all", key, deserialize)
 
     def get_mission(self, id, frame):
         """Returns mission with the matching ID.
 
+        If the mission did not change since the last call, the same messages
+        are returned without being deserialized again.
+
         Args:
             id: Mission ID.
             frame: Frame ID.
@@ -335,8 +757,46 @@ class InteroperabilityClient(object):
             ConnectionError: On connection failure.
             JSONDecodeError: On JSON decoding failure.
         """
-        response = self._get("/api/missions/{:d}".format(id))
-        mission = serializers.MissionDeserializer.from_dict(response.json(), frame)
+        deserialize = lambda m: self.__deserialize_mission(m, frame)
+        key = (frame,)
+        return self.__select_mission(self._get_cached(
+            "/api/missions/{:d}".format(id), "mission", key, deserialize))
+
+    def __deserialize_mission(self, data, frame):
+        """Deserializes a mission in the configured projection, or in its own
+        if none is configured.
+
+        Since the projection only depends on the configuration and the
+        mission itself, the result can be cached regardless of the current
+        projection.
+
+        Args:
+            data: Mission dictionary.
+            frame: Frame ID.
+
+        Returns:
+            Tuple of (projection, mission messages).
+        """
+        projection = self.projection
+        if not self.__fixed_projection:
+            projection = serializers.MissionDeserializer.get_projection(data)
+        return projection, serializers.MissionDeserializer.from_dict(
+            data, frame, projection)
+
+    def __select_mission(self, result):
+        """Switches to the projection of the mission retrieved last, unless
+        one is configured, so that obstacles and missions listed from now on
+        are projected in the same frame.
+
+        Args:
+            result: Tuple of (projection, mission messages).
+
+        Returns:
+            The mission messages.
+        """
+        projection, mission = result
+        if not self.__fixed_projection:
+            self.projection = projection
         return mission
 
     def put_target(self, id, json_target):
@@ -366,12 +826,21 @@ class InteroperabilityClient(object):
         """
         self._delete("/api/targets/{:d}".format(id))
 
-    def post_target_image(self, id, png):
+    def post_target_image(self, id, png, progress=None):
         """Adds or updates target image thumbnail as a compressed PNG.
 
+        Files are streamed with a known length, and iterators of chunks are
+        sent with chunked transfer encoding, so the image never needs to be
+        held in memory in full. Since chunks cannot be read again, an
+        iterator upload fails with an HTTPError if the session expired.
+
         Args:
             id: Target ID.
-            png: Target PNG image from a file.
+            png: Target PNG image, either as a string, as a file opened in
+                binary mode, or as an iterator of string chunks.
+            progress: Callable called with the number of bytes sent so far
+                and the total number of bytes (None if unknown) as the upload
+                progresses, or None.
 
         Raises:
             Timeout: On timeout.
@@ -379,13 +848,24 @@ class InteroperabilityClient(object):
             ConnectionError: On connection failure.
             CvBridgeError: On image conversion failure.
         """
+        if progress is not None:
+            png = ProgressReader(png, progress)
+
         self._post("/api/targets/{:d}/image".format(id), data=png)
 
-    def get_target_image(self, id):
+    def get_target_image(self, id, progress=None, chunk_size=64 * 1024):
         """Retrieves target image thumbnail.
 
+        The image is streamed in chunks into a single buffer, sized up front
+        when the server reports the content length, and decoded once fully
+        received.
+
         Args:
             id: Target ID.
+            progress: Callable called with the number of bytes received so far
+                and the total number of bytes (None if unknown) as the
+                download progresses, or None.
+            chunk_size: Number of bytes to read at a time.
 
         Returns:
             A ROS Image message.
@@ -396,8 +876,31 @@ class InteroperabilityClient(object):
             ConnectionError: On connection failure.
             CvBridgeError: On image conversion failure.
         """
-        response = self._get("/api/targets/{:d}/image".format(id))
-        img = serializers.TargetImageSerializer.from_raw(response.content)
+        response = self._get("/api/targets/{:d}/image".format(id),
+                             stream=True)
+
+        try:
+            total = int(response.headers["Content-Length"])
+        except (KeyError, ValueError):
+            total = None
+
+        buf = bytearray(total or 0)
+        received = 0
+        try:
+            for chunk in response.iter_content(chunk_size):
+                end = received + len(chunk)
+                buf[received:end] = chunk
+                received = end
+
+                if progress is not None:
+                    progress(received, total)
+        finally:
+            response.close()
+
+        if received < len(buf):
+            buf = buf[:received]
+
+        img = serializers.TargetImageSerializer.from_raw(buf)
         return img
 
     def delete_target_image(self, id):
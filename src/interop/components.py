@@ -0,0 +1,966 @@
+# -*- coding: utf-8 -*-
+
+"""Interoperability ROS components.
+
+Each component can either run as its own node, or be loaded alongside the
+others inside a single node that shares one InteroperabilityClient.
+"""
+
+import json
+import mmap
+import rospy
+import threading
+import local_targets
+import serializers
+import message_filters
+from std_msgs.msg import Float64
+from cv_bridge import CvBridgeError
+from sensor_msgs.msg import NavSatFix
+from simplejson import JSONDecodeError
+from client import Backoff, InteroperabilityClient
+from visualization_msgs.msg import Marker, MarkerArray
+from geometry_msgs.msg import PointStamped, PolygonStamped
+from std_srvs.srv import Trigger, TriggerRequest
+from telemetry import TelemetryUploader, UnstampedTimeSynchronizer
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+from interop.msg import FlyZoneArray
+from interop.srv import (AddTarget, AddTargetResponse, DeleteTarget,
+                         DeleteTargetResponse, DeleteTargetImage,
+                         DeleteTargetImageResponse, GetAllTargets,
+                         GetAllTargetsResponse, GetCompressedTargetImage,
+                         GetCompressedTargetImageResponse, GetMissionByID,
+                         GetMissionByIDRequest, GetTarget, GetTargetResponse,
+                         GetTargetImage, GetTargetImageResponse,
+                         SetCompressedTargetImage,
+                         SetCompressedTargetImageResponse, SetTargetImage,
+                         SetTargetImageResponse, UpdateTarget,
+                         UpdateTargetResponse)
+
+
+def create_client(components=None):
+    """Creates an InteroperabilityClient from the node's private parameters.
+
+    Args:
+        components: Names of the components sharing the client, or None for
+            a standalone node.
+
+    Returns:
+        InteroperabilityClient.
+    """
+    # Get ROS parameters for client.
+    base_url = rospy.get_param("~base_url")
+    username = rospy.get_param("~username")
+    password = rospy.get_param("~password")
+    timeout = rospy.get_param("~timeout")
+
+    # Get ROS parameters for the connection pool.
+    pool_connections = rospy.get_param("~pool_connections", 1)
+    pool_maxsize = rospy.get_param("~pool_maxsize", 0)
+    if pool_maxsize <= 0:
+        pool_maxsize = get_pool_maxsize(components)
+    keep_alive = rospy.get_param("~keep_alive", True)
+    tcp_nodelay = rospy.get_param("~tcp_nodelay", True)
+
+    # Get ROS parameters for backing off while the server is unreachable.
+    login_retries = rospy.get_param("~login_retries", 3)
+    backoff = Backoff(initial=rospy.get_param("~backoff_initial", 0.5),
+                      maximum=rospy.get_param("~backoff_max", 30.0),
+                      multiplier=rospy.get_param("~backoff_multiplier", 2.0),
+                      jitter=rospy.get_param("~backoff_jitter", 0.5),
+                      retries=login_retries if login_retries >= 0 else None)
+
+    return InteroperabilityClient(base_url, username, password, timeout,
+                                  pool_connections, pool_maxsize,
+                                  keep_alive, tcp_nodelay, create_projection(),
+                                  backoff)
+
+
+def get_pool_maxsize(components=None):
+    """Returns how many connections the components of a node may use at once,
+    so that none of them are discarded by a full connection pool.
+
+    Each component gets one connection for its periodic requests and one for
+    its service calls, and the targets component one more per concurrent
+    sync.
+
+    Args:
+        components: Names of the components sharing the client, or None for
+            a standalone node.
+
+    Returns:
+        Number of connections.
+    """
+    # A standalone node's parameters are not namespaced by component.
+    if components is None:
+        return 2 + rospy.get_param("~sync_concurrency", 0)
+
+    pool_maxsize = 2 * len(components)
+    if "targets" in components:
+        pool_maxsize += rospy.get_param("~targets/sync_concurrency", 4)
+    return pool_maxsize
+
+
+def create_projection():
+    """Creates the projection of every location from the node's private
+    parameters.
+
+    Returns:
+        serializers.UTMProjection, or None to use that of the mission.
+    """
+    # Empty values leave the zone and origin unset.
+    zone_number = rospy.get_param("~utm_zone", "")
+    latitude = rospy.get_param("~origin_latitude", "")
+    longitude = rospy.get_param("~origin_longitude", "")
+
+    origin = None
+    if latitude != "" and longitude != "":
+        origin = (float(latitude), float(longitude))
+
+    if zone_number != "":
+        return serializers.UTMProjection(int(zone_number), origin)
+    elif origin is not None:
+        return serializers.UTMProjection.from_latlon(origin[0], origin[1],
+                                                     local=True)
+    return None
+
+
+class Component(object):
+
+    """Base interoperability ROS component.
+
+    When running standalone, a component reads its parameters from the node's
+    private namespace, and private topic and service names resolve as usual.
+    When loaded under a name inside a shared node, its parameters are read
+    from ~<name>/ and private topic and service names resolve to <name>/ in
+    the node's namespace, so they match those of the standalone node.
+
+    Attributes:
+        client: Interoperability client shared by all components.
+        name: Component name, or None when running standalone.
+    """
+
+    def __init__(self, client, name=None):
+        """Initializes Component.
+
+        Args:
+            client (interop.InteroperabilityClient): Authenticated
+                interoperability client.
+            name (str): Component name when loaded inside a shared node, or
+                None when running standalone.
+        """
+        self.client = client
+        self.name = name
+
+    def get_param(self, key, *default):
+        """Returns a parameter of this component.
+
+        Args:
+            key (str): Parameter name, relative to this component.
+            *default: Optional default value.
+
+        Returns:
+            The parameter value.
+
+        Raises:
+            KeyError: If the parameter is not set and no default is given.
+        """
+        if self.name:
+            key = "{}/{}".format(self.name, key)
+        return rospy.get_param("~" + key, *default)
+
+    def resolve_name(self, name):
+        """Resolves a topic or service name for this component.
+
+        Args:
+            name (str): Topic or service name.
+
+        Returns:
+            The resolved name.
+        """
+        if self.name and name.startswith("~"):
+            return "{}{}/{}".format(rospy.get_namespace(), self.name,
+                                    name[1:].lstrip("/"))
+        return name
+
+
+class ObstaclesClient(Component):
+
+    """Publishes obstacles from the interoperability server."""
+
+    def __init__(self, client, name=None):
+        """Initializes ObstaclesClient.
+
+        Args:
+            client (interop.InteroperabilityClient): Authenticated
+                interoperability client.
+            name (str): Component name when loaded inside a shared node, or
+                None when running standalone.
+        """
+        super(ObstaclesClient, self).__init__(client, name)
+
+        # Get ROS parameters for published topic names.
+        moving_topic = self.resolve_name(self.get_param("moving_topic"))
+        stationary_topic = self.resolve_name(
+            self.get_param("stationary_topic"))
+
+        # Setup publishers. Stationary obstacles are latched since they are
+        # only published when they change.
+        self.moving_pub = rospy.Publisher(moving_topic, MarkerArray,
+                                          queue_size=1)
+        self.stationary_pub = rospy.Publisher(stationary_topic, MarkerArray,
+                                              queue_size=1, latch=True)
+
+        # Content hash and number of the last published stationary obstacles.
+        self.stationary_hash = None
+        self.stationary_count = 0
+
+        # Get ROS parameter for publishing period and frame ID.
+        period = float(self.get_param("period"))
+        self.frame = str(self.get_param("frame"))
+        self.lifetime = 2 * period
+
+        # Reuses the same markers for every request. Stationary obstacle
+        # markers must last until they are replaced since they are only
+        # published when they change.
+        self.deserializer = serializers.ObstaclesDeserializer(
+            self.frame, self.lifetime, stationary_lifetime=0)
+
+        # Set up ROS timer for publishing at the specified rates.
+        self.timer = rospy.Timer(rospy.Duration(period),
+                                 self.publish_obstacles)
+
+    def publish_obstacles(self, timer_event):
+        """Requests and publishes obstacles.
+
+        Args:
+            timer_event: ROS TimerEvent.
+        """
+        try:
+            moving_obstacles, stationary_obstacles = self.client.get_obstacles(
+                self.frame, self.lifetime, self.deserializer)
+        except (ConnectionError, Timeout) as e:
+            rospy.logwarn(e)
+            return
+        except (JSONDecodeError, HTTPError) as e:
+            rospy.logerr(e)
+            return
+
+        # Markers of moving obstacles that are gone expire on their own.
+        self.moving_pub.publish(moving_obstacles)
+
+        self.publish_stationary_obstacles(stationary_obstacles)
+
+    def publish_stationary_obstacles(self, stationary_obstacles):
+        """Publishes the stationary obstacles if they changed.
+
+        Args:
+            stationary_obstacles: visualization_msgs/MarkerArray of the latest
+                stationary obstacles.
+        """
+        markers = stationary_obstacles.markers
+        content_hash = hash(tuple(
+            (m.pose.position.x, m.pose.position.y, m.pose.position.z,
+             m.scale.x, m.scale.y, m.scale.z)
+            for m in markers))
+        if content_hash == self.stationary_hash:
+            return
+
+        # Markers of obstacles that are gone must be deleted explicitly.
+        # The deserializer's markers are left untouched since it reuses them.
+        count = len(markers)
+        if count < self.stationary_count:
+            stationary_obstacles = MarkerArray(markers=markers + [
+                Marker(ns="stationary_obstacles", id=i, action=Marker.DELETE)
+                for i in range(count, self.stationary_count)
+            ])
+
+        self.stationary_pub.publish(stationary_obstacles)
+        self.stationary_hash = content_hash
+        self.stationary_count = count
+
+
+class MissionsClient(Component):
+
+    """Publishes mission information from the interoperability server."""
+
+    def __init__(self, client, name=None):
+        """Initializes MissionsClient.
+
+        Args:
+            client (interop.InteroperabilityClient): Authenticated
+                interoperability client.
+            name (str): Component name when loaded inside a shared node, or
+                None when running standalone.
+        """
+        super(MissionsClient, self).__init__(client, name)
+
+        # Get topics to publish to.
+        flyzones_topic = self.get_param("flyzones_topic")
+        search_grid_topic = self.get_param("search_grid_topic")
+        waypoints_topic = self.get_param("waypoints_topic")
+        air_drop_topic = self.get_param("air_drop_loc_topic")
+        off_axis_targ_topic = self.get_param("off_axis_targ_topic")
+        emergent_targ_topic = self.get_param("emergent_targ_topic")
+
+        # Setup publishers. These are latched since mission information is
+        # only published when it changes.
+        self.flyzones_pub = rospy.Publisher(
+            self.resolve_name(flyzones_topic), FlyZoneArray, queue_size=1,
+            latch=True)
+        self.search_grid_pub = rospy.Publisher(
+            self.resolve_name(search_grid_topic), PolygonStamped,
+            queue_size=1, latch=True)
+        self.waypoints_pub = rospy.Publisher(
+            self.resolve_name(waypoints_topic), Marker, queue_size=1,
+            latch=True)
+        self.air_drop_pub = rospy.Publisher(
+            self.resolve_name(air_drop_topic), PointStamped, queue_size=1,
+            latch=True)
+        self.off_axis_targ_pub = rospy.Publisher(
+            self.resolve_name(off_axis_targ_topic), PointStamped,
+            queue_size=1, latch=True)
+        self.emergent_targ_pub = rospy.Publisher(
+            self.resolve_name(emergent_targ_topic), PointStamped,
+            queue_size=1, latch=True)
+
+        # Get message parameters. The period is that of an optional
+        # heartbeat republishing the mission information, 0 to disable it.
+        self.frame = str(self.get_param("frame"))
+        self.period = float(self.get_param("period", 0))
+
+        # Create lock for msgs. This is never held during requests.
+        self.lock = threading.Lock()
+        self.msgs = None
+
+        # Mission being published, as an ID or None for the active mission,
+        # and a counter of missions selected so far to discard stale polls.
+        self.selected_id = None
+        self.selections = 0
+
+        # Setup services.
+        rospy.Service(self.resolve_name("get_active_mission"), Trigger,
+                      self.get_active_mission)
+        rospy.Service(self.resolve_name("get_mission_by_id"), GetMissionByID,
+                      self.get_mission_by_id)
+
+        # Get mission to begin publishing, retrying every second until it is
+        # available. This is the first mission published.
+        self.mission_id = self.get_param("id")
+        self.retry_timer = rospy.Timer(rospy.Duration(1),
+                                       self.get_initial_mission)
+
+        # Republish mission information on a timer, if enabled.
+        self.publish_timer = None
+        if self.period > 0:
+            self.publish_timer = rospy.Timer(rospy.Duration(self.period),
+                                             self.publish_mission)
+
+        # Poll the server for changes to the mission being published, if
+        # enabled.
+        self.poll_timer = None
+        poll_period = float(self.get_param("poll_period", 5.0))
+        if poll_period > 0:
+            self.poll_timer = rospy.Timer(rospy.Duration(poll_period),
+                                          self.poll_mission)
+
+    def get_initial_mission(self, timer_event):
+        """Gets the first mission, retrying until it is available.
+
+        Args:
+            timer_event: ROS TimerEvent.
+        """
+        # A mission may have been set through a service meanwhile.
+        if self.msgs is not None:
+            self.retry_timer.shutdown()
+            return
+
+        # If id is negative then it is default and non existent.
+        if self.mission_id >= 0:
+            success, _ = self.get_mission_by_id(
+                GetMissionByIDRequest(id=self.mission_id))
+        else:
+            success, _ = self.get_active_mission(TriggerRequest())
+
+        if success:
+            self.retry_timer.shutdown()
+
+    def fetch_mission(self, mission_id):
+        """Gets mission information from the server.
+
+        Args:
+            mission_id: Mission ID, or None for the active mission.
+
+        Returns:
+            Tuple of mission messages, as returned by the client.
+
+        Raises:
+            Timeout: On timeout.
+            HTTPError: On request failure.
+            ConnectionError: On connection failure.
+            JSONDecodeError: On JSON decoding failure.
+            LookupError: On no active missions found.
+        """
+        if mission_id is None:
+            return self.client.get_active_mission(self.frame)
+        return self.client.get_mission(mission_id, self.frame)
+
+    def select_mission(self, mission_id):
+        """Gets a mission from the server, and publishes it from now on.
+
+        Args:
+            mission_id: Mission ID, or None for the active mission.
+
+        Returns:
+            Tuple of whether it was successful and a message.
+        """
+        try:
+            msgs = self.fetch_mission(mission_id)
+        except (ConnectionError, Timeout) as e:
+            rospy.logwarn(e)
+            return False, str(e)
+        except (JSONDecodeError, HTTPError, LookupError) as e:
+            rospy.logerr(e)
+            return False, str(e)
+
+        with self.lock:
+            self.selected_id = mission_id
+            self.selections += 1
+            self.set_mission(msgs)
+
+        return True, "Success"
+
+    def poll_mission(self, timer_event):
+        """Gets the mission being published again, and publishes it if it
+        changed on the server.
+
+        Args:
+            timer_event: ROS TimerEvent.
+        """
+        with self.lock:
+            if self.msgs is None:
+                return
+            mission_id = self.selected_id
+            selections = self.selections
+
+        try:
+            msgs = self.fetch_mission(mission_id)
+        except (ConnectionError, Timeout) as e:
+            rospy.logwarn(e)
+            return
+        except (JSONDecodeError, HTTPError, LookupError) as e:
+            rospy.logerr(e)
+            return
+
+        with self.lock:
+            # Another mission may have been selected meanwhile.
+            if self.selections == selections:
+                self.set_mission(msgs)
+
+    def set_mission(self, msgs):
+        """Sets the mission information, and publishes it if it changed.
+
+        Must be called with the lock held.
+
+        Args:
+            msgs: Tuple of mission messages, as returned by the client.
+        """
+        # Unchanged missions are returned as is by the client.
+        if msgs is self.msgs:
+            return
+
+        self.msgs = msgs
+        self.publish_mission(None)
+
+    def publish_mission(self, timer_event):
+        """Publishes the mission information.
+
+        Args:
+            timer_event: ROS TimerEvent, or None when not called by a timer.
+        """
+        msgs = self.msgs
+        if msgs is None:
+            return
+
+        self.flyzones_pub.publish(msgs[0])
+        self.search_grid_pub.publish(msgs[1])
+        self.waypoints_pub.publish(msgs[2])
+        self.air_drop_pub.publish(msgs[3])
+        self.off_axis_targ_pub.publish(msgs[4])
+        self.emergent_targ_pub.publish(msgs[5])
+
+    def get_active_mission(self, req):
+        """Service to update mission information with current active mission.
+
+        Args:
+            req: Request of type Trigger.
+
+        Returns:
+            TriggerResponse with true, false for success, failure.
+        """
+        success, message = self.select_mission(None)
+        if success:
+            rospy.loginfo("Using active mission")
+        return success, message
+
+    def get_mission_by_id(self, req):
+        """Service to update mission information with specific mission as
+        given by id.
+
+        Args:
+            req: GetMissionByID type request with field id corresponding to
+                the mission
+
+        Returns:
+            GetMissionByIdResponse which is true for success and false for
+            failure.
+        """
+        success, message = self.select_mission(req.id)
+        if success:
+            rospy.loginfo("Using mission ID: %d", req.id)
+        return success, message
+
+
+class TelemetryClient(Component):
+
+    """Uploads synchronized telemetry to the interoperability server."""
+
+    def __init__(self, client, name=None):
+        """Initializes TelemetryClient.
+
+        Args:
+            client (interop.InteroperabilityClient): Authenticated
+                interoperability client.
+            name (str): Component name when loaded inside a shared node, or
+                None when running standalone.
+        """
+        super(TelemetryClient, self).__init__(client, name)
+
+        # Set up the background uploader.
+        upload_queue_size = self.get_param("upload_queue_size", 1)
+        self.uploader = TelemetryUploader(client, upload_queue_size)
+        self.uploader.start()
+        rospy.on_shutdown(self.uploader.stop)
+
+        # Periodically report upload statistics.
+        stats_period = float(self.get_param("stats_period", 10.0))
+        if stats_period > 0:
+            self.stats_timer = rospy.Timer(rospy.Duration(stats_period),
+                                           self.report_stats)
+
+        # Get ROS parameters for synchronization queue size and time delay.
+        sync_queue = self.get_param("sync_queue_size")
+        sync_delay = self.get_param("max_sync_delay")
+
+        # Get ROS parameters for subscribed topic names.
+        navsat_topic = self.resolve_name(self.get_param("navsat_topic"))
+        compass_topic = self.resolve_name(self.get_param("compass_topic"))
+
+        # Setup synchronized subscribers.
+        subscribers = [
+            message_filters.Subscriber(navsat_topic, NavSatFix),
+            message_filters.Subscriber(compass_topic, Float64)
+        ]
+        self.synchronizer = UnstampedTimeSynchronizer(
+            subscribers,
+            sync_queue,
+            sync_delay)
+        self.synchronizer.registerCallback(self.update_telemetry)
+
+    def update_telemetry(self, navsat_msg, compass_msg):
+        """Telemetry subscription callback.
+
+        Queues the synchronized sample for upload without blocking on the
+        network.
+
+        Args:
+            navsat_msg: sensor_msgs/NavSatFix message.
+            compass_msg: std_msgs/Float64 message in degrees.
+        """
+        self.uploader.put(navsat_msg, compass_msg)
+
+    def report_stats(self, timer_event):
+        """Logs the telemetry upload statistics.
+
+        Args:
+            timer_event: ROS TimerEvent.
+        """
+        stats = self.uploader.stats()
+        rospy.loginfo(
+            "Telemetry: %.2f Hz uploaded, %d queued, %d uploaded, %d failed, "
+            "%d dropped", stats["rate"], stats["depth"], stats["uploaded"],
+            stats["failed"], stats["dropped"])
+
+
+class TargetsServer(Component):
+
+    """Represents the ROS node for adding, updating, and deleting targets
+    and images.
+    Targets and images are stored locally and synced to the interop server
+    as soon as they change, as well as periodically to retry failures.
+    """
+
+    def __init__(self, client, name=None):
+        """Initialize the targets server.
+
+        Args:
+            client (interop.InteroperabilityClient): Authenticated
+                interoperability client.
+            name (str): Component name when loaded inside a shared node, or
+                None when running standalone.
+
+        Raises:
+            OSError: If the targets directory could not be created.
+        """
+        super(TargetsServer, self).__init__(client, name)
+
+        # Images are stored with the image compression level. If an upload
+        # compression level is set as well, images are recompressed with it
+        # by the sync workers right before being uploaded, so that a fast
+        # level can be used to keep image service calls short.
+        compression = int(self.get_param("image_compression", 9))
+        upload_compression = int(self.get_param("upload_compression", -1))
+        self.image_serializer = serializers.TargetImageSerializer(compression)
+        if 0 <= upload_compression != compression:
+            transcode_image = serializers.TargetImageSerializer(
+                upload_compression).recompress
+        else:
+            transcode_image = None
+
+        # Initialize a directory for storing the targets.
+        targets_root = self.get_param("targets_root")
+        sync_concurrency = self.get_param("sync_concurrency", 4)
+        try:
+            self.targets_dir = local_targets.TargetsDirectory(
+                targets_root, client, sync_concurrency, transcode_image)
+        except OSError as e:
+            rospy.logfatal(e)
+            raise
+
+        # Set up a timer to periodically update the targets and images
+        # on the interop server.
+        update_period = self.get_param("interop_update_period")
+        self.timer = rospy.Timer(rospy.Duration(update_period), self.sync)
+
+        # Sync changes as soon as they are made, leaving the timer above to
+        # retry failures.
+        if self.get_param("event_driven_sync", True):
+            debounce = float(self.get_param("sync_debounce", 0.01))
+            self.targets_dir.start_sync_worker(debounce)
+            rospy.on_shutdown(self.targets_dir.stop_sync_worker)
+
+        # Initialize target ROS services.
+        rospy.Service(self.resolve_name("~add"), AddTarget, self.add_target)
+        rospy.Service(self.resolve_name("~get"), GetTarget, self.get_target)
+        rospy.Service(self.resolve_name("~update"), UpdateTarget,
+                      self.update_target)
+        rospy.Service(self.resolve_name("~delete"), DeleteTarget,
+                      self.delete_target)
+        rospy.Service(self.resolve_name("~all"), GetAllTargets,
+                      self.get_all_targets)
+
+        # Initialize target image ROS services.
+        rospy.Service(self.resolve_name("~image/set"), SetTargetImage,
+                      self.set_target_image)
+        rospy.Service(self.resolve_name("~image/get"), GetTargetImage,
+                      self.get_target_image)
+        rospy.Service(self.resolve_name("~image/delete"), DeleteTargetImage,
+                      self.delete_target_image)
+        rospy.Service(self.resolve_name("~image/compressed/set"),
+                      SetCompressedTargetImage,
+                      self.set_compressed_target_image)
+        rospy.Service(self.resolve_name("~image/compressed/get"),
+                      GetCompressedTargetImage,
+                      self.get_compressed_target_image)
+
+    def add_target(self, req):
+        """Handles AddTarget service requests.
+
+        Args:
+            req: AddTargetRequest message.
+
+        Returns:
+            AddTargetResponse.
+        """
+        response = AddTargetResponse()
+
+        dict_target = serializers.TargetSerializer.from_msg(req.target)
+        json_target = json.dumps(dict_target)
+
+        try:
+            file_id = self.targets_dir.add_target(json_target)
+        except IOError as e:
+            rospy.logerr(e)
+            response.success = False
+        else:
+            response.id = file_id
+            response.success = True
+
+        return response
+
+    def get_target(self, req):
+        """Handles GetTarget service requests.
+
+        Args:
+            req: GetTargetRequest message.
+
+        Returns:
+            GetTargetResponse.
+        """
+        response = GetTargetResponse()
+
+        try:
+            json_target = self.targets_dir.get_target(req.id)
+        except (KeyError, IOError) as e:
+            rospy.logerr("Could not get target: {}".format(e))
+            response.success = False
+        else:
+            dict_target = json.loads(json_target)
+            response.target = serializers.TargetSerializer.from_dict(
+                dict_target)
+            response.success = True
+
+        return response
+
+    def update_target(self, req):
+        """Handles UpdateTarget service requests.
+
+        Args:
+            req: UpdateTargetRequest message.
+
+        Returns:
+            UpdateTargetResponse.
+        """
+        response = UpdateTargetResponse()
+
+        dict_target = serializers.TargetSerializer.from_msg(req.target)
+        json_target = json.dumps(dict_target)
+
+        try:
+            self.targets_dir.update_target(req.id, json_target)
+        except (KeyError, IOError) as e:
+            rospy.logerr("Could not update target: {}".format(e))
+            response.success = False
+        else:
+            response.success = True
+
+        return response
+
+    def delete_target(self, req):
+        """Handles DeleteTarget service requests.
+
+        Args:
+            req: DeleteTargetRequest message.
+
+        Returns:
+            DeleteTargetResponse.
+        """
+        response = DeleteTargetResponse()
+
+        try:
+            self.targets_dir.delete_target(req.id)
+        except (KeyError, OSError) as e:
+            rospy.logerr("Could not delete target: {}".format(e))
+            response.success = False
+        else:
+            response.success = True
+
+        return response
+
+    def get_all_targets(self, req):
+        """Handles GetAllTargets service requests.
+
+        Args:
+            req: GetAllTargetsRequest message.
+
+        Returns:
+            GetAllTargetsResponse.
+        """
+        response = GetAllTargetsResponse()
+
+        try:
+            json_targets = self.targets_dir.get_all_targets()
+        except IOError as e:
+            rospy.logerr("Could not get all targets: {}".format(e))
+            response.success = False
+        else:
+            for str_file_id, json_target in json_targets.iteritems():
+                file_id = int(str_file_id)
+                dict_target = json.loads(json_target)
+                ros_target = serializers.TargetSerializer.from_dict(
+                    dict_target)
+
+                response.ids.append(file_id)
+                response.targets.append(ros_target)
+
+            response.success = True
+
+        return response
+
+    def set_target_image(self, req):
+        """Handles SetTargetImage service requests.
+
+        Args:
+            req: SetTargetImageRequest message.
+
+        Returns:
+            SetTargetImageResponse.
+        """
+        response = SetTargetImageResponse()
+
+        try:
+            png_image = self.image_serializer.serialize(req.image)
+        except CvBridgeError as e:
+            rospy.logerr(e)
+            response.success = False
+        else:
+            try:
+                self.targets_dir.set_target_image(req.id, png_image)
+            except (KeyError, IOError) as e:
+                rospy.logerr("Could not set target image: {}".format(e))
+                response.success = False
+            else:
+                response.success = True
+
+        return response
+
+    def get_target_image(self, req):
+        """Handles GetTargetImage service requests.
+
+        Args:
+            req: GetTargetImageRequest message.
+
+        Returns:
+            GetTargetImageResponse.
+        """
+        response = GetTargetImageResponse()
+
+        try:
+            f = self.targets_dir.open_target_image(req.id)
+        except (KeyError, IOError) as e:
+            rospy.logerr("Could not get target image: {}".format(e))
+            response.success = False
+            return response
+
+        # Decode straight from the memory-mapped file, so that the encoded
+        # image is paged in lazily instead of being copied into memory.
+        try:
+            png = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (EnvironmentError, ValueError) as e:
+            rospy.logerr("Could not get target image: {}".format(e))
+            response.success = False
+        else:
+            try:
+                response.image = self.image_serializer.deserialize(png)
+            except CvBridgeError as e:
+                rospy.logerr(e)
+                response.success = False
+            else:
+                response.success = True
+            finally:
+                png.close()
+        finally:
+            f.close()
+
+        return response
+
+    def set_compressed_target_image(self, req):
+        """Handles SetCompressedTargetImage service requests.
+
+        The image is stored as is, without being decoded.
+
+        Args:
+            req: SetCompressedTargetImageRequest message.
+
+        Returns:
+            SetCompressedTargetImageResponse.
+        """
+        response = SetCompressedTargetImageResponse()
+
+        try:
+            image, format = serializers.CompressedTargetImageSerializer \
+                .from_msg(req.image)
+        except ValueError as e:
+            rospy.logerr(e)
+            response.success = False
+        else:
+            try:
+                self.targets_dir.set_target_image(req.id, image, format)
+            except (KeyError, IOError) as e:
+                rospy.logerr("Could not set target image: {}".format(e))
+                response.success = False
+            else:
+                response.success = True
+
+        return response
+
+    def get_compressed_target_image(self, req):
+        """Handles GetCompressedTargetImage service requests.
+
+        The image is returned as stored, without being decoded.
+
+        Args:
+            req: GetCompressedTargetImageRequest message.
+
+        Returns:
+            GetCompressedTargetImageResponse.
+        """
+        response = GetCompressedTargetImageResponse()
+
+        try:
+            image = self.targets_dir.get_target_image(req.id)
+        except (KeyError, IOError) as e:
+            rospy.logerr("Could not get target image: {}".format(e))
+            response.success = False
+            return response
+
+        try:
+            response.image = serializers.CompressedTargetImageSerializer \
+                .from_raw(image)
+        except ValueError as e:
+            rospy.logerr(e)
+            response.success = False
+        else:
+            response.success = True
+
+        return response
+
+    def delete_target_image(self, req):
+        """Handles DeleteTargetImage service requests.
+
+        Args:
+            req: DeleteTargetImageRequest message.
+
+        Returns:
+            DeleteTargetImageResponse.
+        """
+        response = DeleteTargetImageResponse()
+
+        try:
+            self.targets_dir.delete_target_image(req.id)
+        except (KeyError, IOError) as e:
+            rospy.logerr("Could not delete target image: {}".format(e))
+            response.success = False
+        else:
+            response.success = True
+
+        return response
+
+    def sync(self, rospy_timer_event):
+        """Handles calls from rospy.Timer to sync the local targets and images
+        to the interop server.
+
+        Args:
+            rospy_timer_event (rospy.TimerEvent): Unused formal parameter
+                necessary for making this function work as a callback for
+                rospy.Timer.
+        """
+        self.targets_dir.sync()
+
+
+# Available components by name.
+COMPONENTS = {
+    "obstacles": ObstaclesClient,
+    "mission_info": MissionsClient,
+    "telemetry": TelemetryClient,
+    "targets": TargetsServer
+}
@@ -2,10 +2,12 @@
 
 import os
 import os.path
+import time
 import errno
 import datetime
 import threading
 import rospy
+from concurrent.futures import ThreadPoolExecutor, wait
 from cv_bridge import CvBridgeError
 from simplejson import JSONDecodeError
 from requests.exceptions import ConnectionError, HTTPError, Timeout
@@ -19,7 +21,8 @@ class Target(object):
     interop server.
     """
 
-    def __init__(self, targets_dir, file_id, data, client):
+    def __init__(self, targets_dir, file_id, data, client, on_dirty=None,
+                 transcode=None):
         """Creates the target file with the specified data, inside the
         specified directory.
 
@@ -32,6 +35,11 @@ class Target(object):
             client (interop.InteroperabilityClient): Interoperability client
                 that will be used to sync the target and its image to the
                 server.
+            on_dirty (callable): Called with this target whenever it has
+                something new to sync, or None.
+            transcode (callable): Called with the contents of the stored
+                image to get the image to upload, e.g. to recompress it, or
+                None to upload the stored image as is.
 
         Raises:
             IOError: If the target file could not be written.
@@ -44,6 +52,8 @@ class Target(object):
 
         self.client = client
         self.targets_dir = targets_dir
+        self.on_dirty = on_dirty
+        self.transcode = transcode
 
         self.file_id = file_id
         self.interop_id = None  # Also used to indicate presence on the server.
@@ -57,11 +67,25 @@ class Target(object):
         self._image_needs_setting = False
         self._image_needs_deleting = False
 
+        # Serializes concurrent syncs of this target, so that the same change
+        # is never sent twice. Never held by local changes.
+        self.sync_lock = threading.Lock()
+
+        # Incremented on every local change to the target data and image
+        # respectively, to detect changes made while syncing.
+        self._version = 0
+        self._image_version = 0
+        self._image_is_local = False
+
         filename = str(self.file_id) + ".json"
         # self.target_path may become None when target is deleted locally.
         self.target_path = os.path.join(self.targets_dir, filename)
         self.image_path = None
 
+        # Write-through cache of the target file's contents, so that reads
+        # never touch the disk. None when not cached.
+        self._data = None
+
         # Create the target file.
         with self.lock:
             try:
@@ -70,6 +94,7 @@ class Target(object):
             except IOError as e:
                 raise
 
+            self._data = data
             self.needs_adding = True
 
     @property
@@ -79,6 +104,8 @@ class Target(object):
     @needs_adding.setter
     def needs_adding(self, value):
         self._needs_adding = value
+        if value:
+            self._mark_dirty()
 
     @property
     def needs_updating(self):
@@ -95,6 +122,7 @@ class Target(object):
                 self._needs_updating = False
             else:
                 self._needs_updating = True
+                self._mark_dirty()
         else:
             self._needs_updating = False
 
@@ -122,6 +150,10 @@ class Target(object):
             # deleted together with the target anyway.
             self.image_needs_setting = False
             self.image_needs_deleting = False
+
+            # Even if there is nothing to do on the server, the target may
+            # now be forgotten.
+            self._mark_dirty()
         else:
             self._needs_deleting = False
 
@@ -136,6 +168,8 @@ class Target(object):
             self._image_needs_setting = False
         else:
             self._image_needs_setting = value
+            if value:
+                self._mark_dirty()
 
     @property
     def image_needs_deleting(self):
@@ -152,9 +186,28 @@ class Target(object):
             else:
                 self._image_needs_setting = False
                 self._image_needs_deleting = True
+                self._mark_dirty()
         else:
             self._image_needs_deleting = False
 
+    def _mark_dirty(self):
+        """Notifies that this target has something new to sync."""
+        if self.on_dirty is not None:
+            self.on_dirty(self)
+
+    def has_pending_changes(self):
+        """Returns whether anything remains to be synced to the interop
+        server.
+
+        Returns:
+            True if the target or its image still needs syncing, False
+            otherwise.
+        """
+        with self.lock:
+            return (self.needs_adding or self.needs_updating
+                    or self.needs_deleting or self.image_needs_setting
+                    or self.image_needs_deleting)
+
     def update(self, data):
         """Update this target.
 
@@ -174,8 +227,12 @@ class Target(object):
                     with open(self.target_path, "w", 0) as f:
                         f.write(data)
                 except IOError as e:
+                    # The file's contents are now unknown.
+                    self._data = None
                     raise
 
+                self._data = data
+                self._version += 1
                 self.needs_updating = True
 
     def delete(self):
@@ -198,6 +255,7 @@ class Target(object):
                     raise
 
                 self.target_path = None
+                self._data = None
 
             # Delete associated image.
             if self.image_path is not None:
@@ -208,11 +266,15 @@ class Target(object):
 
                 self.image_path = None
 
+            self._image_is_local = False
             self.needs_deleting = True
 
     def get(self):
         """Returns the content of the target file.
 
+        This is served from memory, and only falls back to reading the file
+        if its contents are not cached.
+
         Returns:
             str: The contents of the target file.
 
@@ -224,6 +286,8 @@ class Target(object):
             if self.target_path is None:
                 raise IOError("Target file for file_id {} does not exist."
                     .format(self.file_id))
+            elif self._data is not None:
+                return self._data
             else:
                 try:
                     with open(self.target_path, "r") as f:
@@ -231,27 +295,45 @@ class Target(object):
                 except IOError as e:
                     raise
 
+                self._data = data
                 return data
 
-    def set_image(self, png_image):
+    def set_image(self, png_image, extension="png"):
         """Associate an image with this target, or update the existing image.
 
         Args:
-            png_image (str): The PNG image to be written.
+            png_image (str): The encoded image to be written.
+            extension (str): The image file extension, according to its
+                format.
 
         Raises:
             IOError: If the image could not be written.
         """
         with self.lock:
-            filename = str(self.file_id) + ".png"
-            self.image_path = os.path.join(self.targets_dir, filename)
+            filename = str(self.file_id) + "." + extension
+            image_path = os.path.join(self.targets_dir, filename)
 
+            # Write to a temporary file first and atomically replace the
+            # image, so that open_image() handles in use keep reading the
+            # previous image in full.
+            tmp_path = image_path + ".tmp"
             try:
-                with open(self.image_path, "w", 0) as f:
+                with open(tmp_path, "wb", 0) as f:
                     f.write(png_image)
-            except IOError as e:
-                raise
+                os.rename(tmp_path, image_path)
+            except (IOError, OSError) as e:
+                raise IOError(e)
+
+            # Remove the previous image if it was in another format.
+            if self.image_path is not None and self.image_path != image_path:
+                try:
+                    os.remove(self.image_path)
+                except OSError as e:
+                    rospy.logwarn(e)
+            self.image_path = image_path
 
+            self._image_version += 1
+            self._image_is_local = True
             self.image_needs_setting = True
 
     def delete_image(self):
@@ -272,6 +354,8 @@ class Target(object):
                 except OSError as e:
                     raise
 
+            self._image_version += 1
+            self._image_is_local = False
             self.image_needs_deleting = True
 
     def get_image(self):
@@ -296,83 +380,167 @@ class Target(object):
 
                 return png_image
 
+    def open_image(self):
+        """Opens the image associated with this target for reading, without
+        loading it into memory.
+
+        The returned file keeps referring to the same image even if the image
+        is later replaced or deleted, and must be closed by the caller.
+
+        Returns:
+            file: The image file opened in binary mode.
+
+        Raises:
+            IOError: If the path to the image file is not known, or if the
+                file could not be opened.
+        """
+        with self.lock:
+            if self.image_path is None:
+                raise IOError("Could not open image file. "
+                    "There is no image associated with file_id {}."
+                    .format(self.file_id))
+
+            return open(self.image_path, "rb")
+
     def sync(self):
-        """Syncs this target and its image to the interop server."""
+        """Syncs this target and its image to the interop server.
+
+        The lock is only held to decide what to sync and to record the
+        outcome, not during network I/O, so that local changes are never
+        blocked by the server. Changes made while a request is in flight are
+        synced on the next call.
+        """
+        with self.sync_lock:
+            self._sync_target()
+            self._sync_image()
+
+    def _sync_target(self):
+        """Syncs this target's data to the interop server."""
+        # Decide what to do.
         with self.lock:
-            # TARGET FILE
-            if self.needs_adding:
-                try:
-                    target = self.get()
-                except IOError as e:
-                    rospy.logerr(e)
-                else:
-                    try:
-                        # Post target and record the interop_id.
-                        self.interop_id = self.client.post_target(target)
-                    except (ConnectionError, Timeout) as e:
-                        rospy.logwarn(e)
-                    except (JSONDecodeError, HTTPError) as e:
-                        rospy.logerr(e)
-                    else:
-                        # No longer needs adding.
-                        self.needs_adding = False
+            version = self._version
+            interop_id = self.interop_id
 
+            if self.needs_adding:
+                action = "add"
             # An interop id is needed to update.
-            elif self.needs_updating and self.interop_id is not None:
+            elif self.needs_updating and interop_id is not None:
+                action = "update"
+            elif self.needs_deleting and interop_id is not None:
+                action = "delete"
+            else:
+                return
+
+            if action != "delete":
                 try:
                     target = self.get()
                 except IOError as e:
                     rospy.logerr(e)
-                else:
-                    try:
-                        self.client.put_target(self.interop_id, target)
-                    except (ConnectionError, Timeout) as e:
-                        rospy.logwarn(e)
-                    except (JSONDecodeError, HTTPError) as e:
-                        rospy.logerr(e)
-                    else:
-                        self.needs_updating = False
-
-            elif self.needs_deleting and self.interop_id is not None:
-                try:
-                    self.client.delete_target(self.interop_id)
-                except (ConnectionError, Timeout) as e:
-                    rospy.logwarn(e)
-                except (JSONDecodeError, HTTPError) as e:
-                    rospy.logerr(e)
-                else:
-                    self.interop_id = None
-                    self.image_is_on_server = False
-                    self.needs_deleting = False
+                    return
+
+        # Send request without holding the lock.
+        try:
+            if action == "add":
+                # Post target and record the interop_id.
+                interop_id = self.client.post_target(target)
+            elif action == "update":
+                self.client.put_target(interop_id, target)
+            else:
+                self.client.delete_target(interop_id)
+        except (ConnectionError, Timeout) as e:
+            rospy.logwarn(e)
+            return
+        except (JSONDecodeError, HTTPError) as e:
+            rospy.logerr(e)
+            return
+
+        # Record the outcome.
+        with self.lock:
+            if action == "add":
+                self.interop_id = interop_id
+
+                # No longer needs adding.
+                self.needs_adding = False
+
+                # The target may have changed while it was being added.
+                if self.target_path is None:
+                    self.needs_deleting = True
+                elif self._version != version:
+                    self.needs_updating = True
+
+            elif action == "update":
+                # The target may have changed while it was being updated.
+                if self._version == version:
+                    self.needs_updating = False
+
+            else:
+                self.interop_id = None
+                self.image_is_on_server = False
+                self.needs_deleting = False
+
+    def _sync_image(self):
+        """Syncs this target's image to the interop server."""
+        # Decide what to do.
+        with self.lock:
+            version = self._image_version
+            interop_id = self.interop_id
 
-            # IMAGE FILE
-            if self.image_needs_setting and self.interop_id is not None:
+            if self.image_needs_setting and interop_id is not None:
+                action = "set"
                 try:
-                    image = self.get_image()
+                    # Stream the image from disk rather than loading it.
+                    image = self.open_image()
                 except IOError as e:
                     rospy.logerr(e)
-                else:
-                    try:
-                        self.client.post_target_image(self.interop_id, image)
-                    except (ConnectionError, Timeout) as e:
-                        rospy.logwarn(e)
-                    except (CvBridgeError, HTTPError) as e:
-                        rospy.logerr(e)
-                    else:
-                        self.image_is_on_server = True
-                        self.image_needs_setting = False
-
+                    return
             elif (self.image_needs_deleting and self.image_is_on_server
-                    and self.interop_id is not None):
-                try:
-                    self.client.delete_target_image(self.interop_id)
-                except (ConnectionError, Timeout) as e:
-                    rospy.logwarn(e)
-                except (CvBridgeError, HTTPError) as e:
-                    rospy.logerr(e)
+                    and interop_id is not None):
+                action = "delete"
+            else:
+                return
+
+        # Send request without holding the lock.
+        try:
+            if action == "set":
+                if self.transcode is not None:
+                    # Done here rather than when the image is set, to keep
+                    # the work off the service call.
+                    data = self.transcode(image.read())
                 else:
-                    self.image_is_on_server = False
-                    self.image_needs_deleting = False
+                    data = image
+                self.client.post_target_image(interop_id, data)
+            else:
+                self.client.delete_target_image(interop_id)
+        except (ConnectionError, Timeout) as e:
+            rospy.logwarn(e)
+            return
+        except (CvBridgeError, HTTPError, ValueError) as e:
+            rospy.logerr(e)
+            return
+        finally:
+            if action == "set":
+                image.close()
+
+        # Record the outcome.
+        with self.lock:
+            # The target may have been deleted from the server meanwhile, in
+            # which case its image went along with it.
+            if self.interop_id != interop_id:
+                return
+
+            if action == "set":
+                self.image_is_on_server = True
+                if self._image_version == version:
+                    self.image_needs_setting = False
+                elif not self._image_is_local and self.target_path is not None:
+                    # The image was deleted locally while being uploaded.
+                    self.image_needs_deleting = True
+            else:
+                self.image_is_on_server = False
+                self.image_needs_deleting = False
+                if self._image_version != version and self._image_is_local:
+                    # A new image was set locally while deleting the old one.
+                    self.image_needs_setting = True
 
     def can_be_forgotten(self):
         """When a target is removed locally and on the interop server, it
@@ -389,8 +557,7 @@ class Target(object):
                 return False
 
             # If there are still things to be done on the interop server.
-            if (self.needs_adding or self.needs_updating or self.needs_deleting
-                    or self.image_needs_setting or self.image_needs_deleting):
+            if self.has_pending_changes():
                 return False
 
             # Otherwise, the target is useless and all references can be deleted.
@@ -404,7 +571,8 @@ class TargetsDirectory(object):
     the interop server.
     """
 
-    def __init__(self, targets_root, client):
+    def __init__(self, targets_root, client, max_concurrent_syncs=4,
+                 transcode_image=None):
         """Creates a directory for storing targets and images.
 
         Args:
@@ -412,12 +580,23 @@ class TargetsDirectory(object):
                 the directory to be created.
             client (interop.InteroperabilityClient): Interoperability client that
                 will be used to handle syncs to the interop server.
+            max_concurrent_syncs (int): Maximum number of targets to sync to
+                the interop server at once.
+            transcode_image (callable): Called with the contents of a stored
+                image to get the image to upload, or None to upload stored
+                images as is.
 
         Raises:
             OSError: If the directory could not be created.
         """
         self.lock = threading.Lock()
 
+        # Worker pool used to sync targets concurrently.
+        self.executor = ThreadPoolExecutor(max_concurrent_syncs)
+
+        # Duration in seconds of the last sync round.
+        self.last_sync_duration = None
+
         # Create timestamp (YYYY-mm-DD-hh-MM-ss).
         timestamp = "{:%Y-%m-%d-%H-%M-%S}".format(datetime.datetime.now())
 
@@ -447,6 +626,7 @@ class TargetsDirectory(object):
 
         # Client used to update the interop server.
         self.client = client
+        self.transcode_image = transcode_image
 
         # Highest file id so far.
         self.file_id = 0
@@ -455,6 +635,92 @@ class TargetsDirectory(object):
         # {file_id (int): target (Target)}
         self.targets = {}
 
+        # Targets with something new to sync, so that syncs need not visit
+        # every target. Guarded by its own lock since targets report
+        # themselves while the directory lock may be held.
+        self.dirty = set()
+        self.dirty_lock = threading.Condition()
+
+        # Event-driven sync worker state.
+        self._sync_requested = False
+        self._sync_worker = None
+        self._sync_worker_running = False
+
+    def mark_dirty(self, target, wake=True):
+        """Schedules a target to be visited by the next sync.
+
+        Args:
+            target (Target): The target that has something new to sync.
+            wake (bool): Whether to wake the sync worker, if running.
+        """
+        with self.dirty_lock:
+            self.dirty.add(target)
+            if wake:
+                self._sync_requested = True
+                self.dirty_lock.notify()
+
+    def start_sync_worker(self, debounce=0.01):
+        """Starts syncing changed targets as soon as they change.
+
+        The worker waits for the debounce period after being woken up before
+        syncing, so that rapid successive changes are coalesced into a single
+        sync. Failed syncs do not wake the worker, and are left to the next
+        periodic sync() to retry.
+
+        Args:
+            debounce (float): Time in seconds to wait for further changes
+                before syncing.
+        """
+        with self.dirty_lock:
+            if self._sync_worker_running:
+                return
+            self._sync_worker_running = True
+
+        self._sync_worker = threading.Thread(target=self._run_sync_worker,
+                                             args=(debounce,),
+                                             name="targets_sync")
+        self._sync_worker.daemon = True
+        self._sync_worker.start()
+
+    def stop_sync_worker(self, timeout=None):
+        """Stops the event-driven sync worker.
+
+        Args:
+            timeout (float): Maximum time in seconds to wait for a sync in
+                progress to finish, or None to wait indefinitely.
+        """
+        with self.dirty_lock:
+            self._sync_worker_running = False
+            self.dirty_lock.notify_all()
+
+        if self._sync_worker is not None:
+            self._sync_worker.join(timeout)
+            self._sync_worker = None
+
+    def _run_sync_worker(self, debounce):
+        """Syncs whenever woken up until stopped.
+
+        Args:
+            debounce (float): Time in seconds to wait for further changes
+                before syncing.
+        """
+        while True:
+            with self.dirty_lock:
+                while self._sync_worker_running and not self._sync_requested:
+                    self.dirty_lock.wait()
+
+                if not self._sync_worker_running:
+                    return
+
+            # Coalesce rapid successive changes.
+            if debounce > 0:
+                time.sleep(debounce)
+
+            with self.dirty_lock:
+                self._sync_requested = False
+
+            self.sync()
+
     def add_target(self, data):
         """Adds a target.
 
@@ -471,7 +737,8 @@ class TargetsDirectory(object):
             # New file_id.
             file_id = self.file_id + 1
 
-            target = Target(self.targets_dir, file_id, data, self.client)
+            target = Target(self.targets_dir, file_id, data, self.client,
+                            self.mark_dirty, self.transcode_image)
 
             self.targets[file_id] = target
             # Record the largest file_id so far.
@@ -550,7 +817,7 @@ class TargetsDirectory(object):
 
         return targets
 
-    def set_target_image(self, file_id, png_image):
+    def set_target_image(self, file_id, png_image, extension="png"):
         """Associates an image with a target or updates an existing target
         image.
 
@@ -558,6 +825,8 @@ class TargetsDirectory(object):
             file_id (int): The file id of the target to associate the image
                 with.
             png_image (str): The image to add or update.
+            extension (str): The image file extension, according to its
+                format.
 
         Raises:
             KeyError: If the file_id does not exist in the self.targets
@@ -567,7 +836,7 @@ class TargetsDirectory(object):
         with self.lock:
             target = self.targets[file_id]
 
-        target.set_image(png_image)
+        target.set_image(png_image, extension)
 
     def delete_target_image(self, file_id):
         """Deletes an existing target image.
@@ -605,15 +874,66 @@ class TargetsDirectory(object):
 
         return target.get_image()
 
+    def open_target_image(self, file_id):
+        """Opens a target image for reading without loading it into memory.
+
+        Args:
+            file_id (int): The file id of the target associated with the image.
+
+        Returns:
+            file: The target image opened in binary mode, to be closed by the
+            caller.
+
+        Raises:
+            KeyError: If the file_id does not exist in the self.targets
+                dictionary.
+            IOError: If the path to the image file is not known, or if the
+                file could not be opened.
+        """
+        with self.lock:
+            target = self.targets[file_id]
+
+        return target.open_image()
+
     def sync(self):
-        """Syncs all the targets and their images to the interop server."""
+        """Syncs all changed targets and their images to the interop server.
+
+        Only targets that were marked dirty since the last sync are visited.
+        They are synced concurrently, and the directory lock is only held to
+        clean up the targets, so other calls are not blocked by the network.
+        Targets that failed to sync are visited again on the next call.
+
+        Returns:
+            float: Duration of the sync round in seconds.
+        """
+        start = time.time()
+
+        with self.dirty_lock:
+            targets = list(self.dirty)
+            self.dirty.clear()
+
+        # Sync all targets, and wait for all of them to be done.
+        futures = [self.executor.submit(target.sync) for target in targets]
+        wait(futures)
+        for future in futures:
+            if future.exception() is not None:
+                rospy.logerr("Could not sync target: {}".format(
+                    future.exception()))
+
+        # Retry targets that failed to sync on the next periodic call.
+        for target in targets:
+            if target.has_pending_changes():
+                self.mark_dirty(target, wake=False)
+
+        # Delete unused targets from the targets dictionary.
         with self.lock:
-            # Sync all targets.
-            for target_id, target in self.targets.iteritems():
-                target.sync()
-
-            # Delete unused targets from the targets dictionary.
-            for file_id in list(self.targets):
-                target = self.targets[file_id]
-                if target.can_be_forgotten():
-                    del self.targets[file_id]
+            for target in targets:
+                if (target.can_be_forgotten()
+                        and self.targets.get(target.file_id) is target):
+                    del self.targets[target.file_id]
+
+        self.last_sync_duration = time.time() - start
+        rospy.logdebug("Synced {} targets in {:.3f} s".format(
+            len(targets), self.last_sync_duration))
+
+        return self.last_sync_duration
@@ -6,11 +6,14 @@ Serializes from ROS messages to python dictionaries and vice versa."""
 import cv2
 import utm
 import rospy
+import threading
+import collections
 import numpy as np
 import dateutil.parser
 from dateutil.tz import tzutc
 from datetime import datetime
 from cv_bridge import CvBridge
+from sensor_msgs.msg import CompressedImage
 from geometry_msgs.msg import Point, PointStamped, PolygonStamped, Polygon
 from visualization_msgs.msg import Marker, MarkerArray
 from std_msgs.msg import ColorRGBA, Float64, Header, String, Time
@@ -69,18 +72,164 @@ def iso8601_to_rostime(iso):
     return time
 
 
+# WGS 84 transverse Mercator projection constants, as used by utm.
+UTM_K0 = 0.9996
+UTM_E = 0.00669438
+UTM_E2 = UTM_E * UTM_E
+UTM_E3 = UTM_E2 * UTM_E
+UTM_E_P2 = UTM_E / (1.0 - UTM_E)
+UTM_M1 = (1 - UTM_E / 4 - 3 * UTM_E2 / 64 - 5 * UTM_E3 / 256)
+UTM_M2 = (3 * UTM_E / 8 + 3 * UTM_E2 / 32 + 45 * UTM_E3 / 1024)
+UTM_M3 = (15 * UTM_E2 / 256 + 45 * UTM_E3 / 1024)
+UTM_M4 = (35 * UTM_E3 / 3072)
+UTM_R = 6378137
+
+
+class UTMProjection(object):
+
+    """Projection of latitudes and longitudes in a fixed UTM zone.
+
+    Everything that only depends on the zone is computed once, and every
+    point is projected in that zone and hemisphere, even if it lies in a
+    neighboring zone or across the equator, so that they all end up in the
+    same frame.
+
+    Coordinates can optionally be made relative to a local origin, so that
+    they stay small enough to be represented precisely as floats. They are
+    then the distances east and north of the origin along the UTM grid.
+
+    Attributes:
+        zone_number: UTM zone number.
+        northern: Whether to project in the northern hemisphere.
+        origin: Tuple of (latitude, longitude) of the local origin in
+            degrees, or None for plain UTM coordinates.
+    """
+
+    def __init__(self, zone_number, origin=None, northern=None):
+        """Initializes UTMProjection.
+
+        Args:
+            zone_number: UTM zone number to project in.
+            origin: Tuple of (latitude, longitude) of the local origin in
+                degrees, or None for plain UTM coordinates.
+            northern: Whether to project in the northern hemisphere, or None
+                to use that of the origin, or the northern one if there is
+                no origin.
+        """
+        if northern is None:
+            northern = origin is None or origin[0] >= 0
+
+        self.zone_number = zone_number
+        self.northern = northern
+        self.origin = origin
+
+        self._central_lon_rad = np.radians((zone_number - 1) * 6 - 180 + 3)
+        self._offset = (0.0, 0.0)
+        if origin is not None:
+            eastings, northings = self.project([origin[0]], [origin[1]])
+            self._offset = (eastings[0], northings[0])
+
+    @classmethod
+    def from_latlon(cls, latitude, longitude, local=False):
+        """Creates a projection in the UTM zone of a point.
+
+        Args:
+            latitude: Latitude in degrees.
+            longitude: Longitude in degrees.
+            local: Whether to use the point as the local origin.
+
+        Returns:
+            UTMProjection.
+        """
+        zone_number = utm.latlon_to_zone_number(latitude, longitude)
+        origin = (latitude, longitude) if local else None
+        return cls(zone_number, origin, latitude >= 0)
+
+    def project(self, latitudes, longitudes):
+        """Projects latitudes and longitudes all at once.
+
+        Args:
+            latitudes: Sequence of latitudes in degrees.
+            longitudes: Sequence of longitudes in degrees.
+
+        Returns:
+            Tuple of (eastings, northings) NumPy arrays in meters.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+
+        lat_rad = np.radians(latitudes)
+        lat_sin = np.sin(lat_rad)
+        lat_cos = np.cos(lat_rad)
+
+        lat_tan = lat_sin / lat_cos
+        lat_tan2 = lat_tan * lat_tan
+        lat_tan4 = lat_tan2 * lat_tan2
+
+        lon_rad = np.radians(longitudes)
+
+        n = UTM_R / np.sqrt(1 - UTM_E * lat_sin ** 2)
+        c = UTM_E_P2 * lat_cos ** 2
+
+        a = lat_cos * (lon_rad - self._central_lon_rad)
+        a2 = a * a
+        a3 = a2 * a
+        a4 = a3 * a
+        a5 = a4 * a
+        a6 = a5 * a
+
+        m = UTM_R * (UTM_M1 * lat_rad -
+                     UTM_M2 * np.sin(2 * lat_rad) +
+                     UTM_M3 * np.sin(4 * lat_rad) -
+                     UTM_M4 * np.sin(6 * lat_rad))
+
+        eastings = UTM_K0 * n * (
+            a +
+            a3 / 6 * (1 - lat_tan2 + c) +
+            a5 / 120 * (5 - 18 * lat_tan2 + lat_tan4 + 72 * c - 58 * UTM_E_P2)
+        ) + 500000
+
+        northings = UTM_K0 * (m + n * lat_tan * (
+            a2 / 2 +
+            a4 / 24 * (5 - lat_tan2 + 9 * c + 4 * c ** 2) +
+            a6 / 720 * (61 - 58 * lat_tan2 + lat_tan4 + 600 * c -
+                        330 * UTM_E_P2)
+        ))
+        if not self.northern:
+            northings += 10000000
+
+        return eastings - self._offset[0], northings - self._offset[1]
+
+    def project_points(self, points):
+        """Projects a list of points all at once.
+
+        Args:
+            points: List of dictionaries with "latitude" and "longitude" keys
+                in degrees.
+
+        Returns:
+            Tuple of (eastings, northings) lists in meters.
+        """
+        eastings, northings = self.project(
+            [point["latitude"] for point in points],
+            [point["longitude"] for point in points])
+
+        return eastings.tolist(), northings.tolist()
+
+
 class MissionDeserializer(object):
 
     """Mission information deserializer."""
 
     @classmethod
-    def __get_flyzone(cls, data, frame):
+    def __get_flyzone(cls, data, frame, projection):
         """
         Deserializes flight boundary data into a FlyZoneArray message.
 
         Args:
             data: List of dictionaries.
             frame: Frame id for the boundaries.
+            projection: UTMProjection to project locations with.
 
         Returns:
             A FlyzoneArray message type which contains an array of FlyZone
@@ -101,11 +250,10 @@ class MissionDeserializer(object):
             flyzone.min_alt = feet_to_meters(zone["altitude_msl_min"])
 
             # Change boundary points to ros message of type polygon.
-            for waypoint in zone["boundary_pts"]:
+            eastings, northings = projection.project_points(
+                zone["boundary_pts"])
+            for easting, northing in zip(eastings, northings):
                 point = Point()
-                easting, northing, _, _ = utm.from_latlon(
-                                                      waypoint["latitude"],
-                                                      waypoint["longitude"])
                 point.x = easting
                 point.y = northing
                 flyzone.zone.polygon.points.append(point)
@@ -115,13 +263,14 @@ class MissionDeserializer(object):
         return flyzones
 
     @classmethod
-    def __get_waypoints(cls, data, frame):
+    def __get_waypoints(cls, data, frame, projection):
         """
         Deserializes a list of waypoints into a marker message.
 
         Args:
             data: List of dictionaries corresponding to waypoints.
             frame: Frame of the markers.
+            projection: UTMProjection to project locations with.
 
         Returns:
             A marker message of type Points, with a list of points in order
@@ -142,10 +291,9 @@ class MissionDeserializer(object):
         # Ensure there is no rotation by setting w to 1.
         waypoints.pose.orientation.w = 1.0
         waypoints.scale.x = waypoints.scale.y = waypoints.scale.z = 0.1
-        for point in data:
+        eastings, northings = projection.project_points(data)
+        for point, easting, northing in zip(data, eastings, northings):
             waypoint = Point()
-            easting, northing, _, _ = utm.from_latlon(point["latitude"],
-                                                      point["longitude"])
             altitude = feet_to_meters(point["altitude_msl"])
 
             waypoint.x = easting
@@ -157,13 +305,14 @@ class MissionDeserializer(object):
         return waypoints
 
     @classmethod
-    def __get_search_grid(cls, data, frame):
+    def __get_search_grid(cls, data, frame, projection):
         """
         Deserializes a the search grid into a polygon message.
 
         Args:
             data: List of dictionaries corresponding to the search grid points.
             frame: Frame for the polygon.
+            projection: UTMProjection to project locations with.
 
         Returns:
             Message of type PolygonStamped with the bounds of the search grid.
@@ -175,11 +324,10 @@ class MissionDeserializer(object):
         search_grid = PolygonStamped()
         search_grid.header = header
 
-        for point in data:
+        eastings, northings = projection.project_points(data)
+        for point, easting, northing in zip(data, eastings, northings):
             boundary_pnt = Point()
 
-            easting, northing, _, _ = utm.from_latlon(point["latitude"],
-                                                      point["longitude"])
             altitude = feet_to_meters(point["altitude_msl"])
 
             boundary_pnt.x = easting
@@ -191,7 +339,7 @@ class MissionDeserializer(object):
         return search_grid
 
     @classmethod
-    def __get_airdrop_loc(cls, data, frame):
+    def __get_airdrop_loc(cls, data, frame, projection):
         """
         Deserializes the airdrop location to a ros message of type
         PointStamped.
@@ -199,6 +347,7 @@ class MissionDeserializer(object):
         Args:
             data: A dictionary with the air drop location.
             frame: Frame for the point.
+            projection: UTMProjection to project locations with.
 
         Returns:
             A PointStamped message with x and y corresponding to the airdrop
@@ -211,21 +360,21 @@ class MissionDeserializer(object):
         air_drop = PointStamped()
         air_drop.header = header
 
-        easting, northing, _, _ = utm.from_latlon(data["latitude"],
-                                                  data["longitude"])
+        (easting,), (northing,) = projection.project_points([data])
         air_drop.point.x = easting
         air_drop.point.y = northing
 
         return air_drop
 
     @classmethod
-    def __get_offaxis_targ(cls, data, frame):
+    def __get_offaxis_targ(cls, data, frame, projection):
         """
         Deserializes off axis target location to a message of type PointStamped.
 
         Args:
             data: A dictionary containing the off axis target location.
             frame: Frame for the point.
+            projection: UTMProjection to project locations with.
 
         Returns:
             A message of type PointStamped with the location of the off axis
@@ -238,8 +387,7 @@ class MissionDeserializer(object):
         off_axis_targ = PointStamped()
         off_axis_targ.header = header
 
-        easting, northing, _, _ = utm.from_latlon(data["latitude"],
-                                                  data["longitude"])
+        (easting,), (northing,) = projection.project_points([data])
 
         off_axis_targ.point.x = easting
         off_axis_targ.point.y = northing
@@ -247,7 +395,7 @@ class MissionDeserializer(object):
         return off_axis_targ
 
     @classmethod
-    def __emergent_object(cls, data, frame):
+    def __emergent_object(cls, data, frame, projection):
         """
         Deserializes the last known location of the emergent target to a
         ros message of type PointStamped.
@@ -255,6 +403,7 @@ class MissionDeserializer(object):
         Args:
             data: A dictionary with the corresponding location.
             frame: Frame for the point.
+            projection: UTMProjection to project locations with.
 
         Returns:
             A PointStamped message with the information about the last known
@@ -267,8 +416,7 @@ class MissionDeserializer(object):
         emergent_obj = PointStamped()
         emergent_obj.header = header
 
-        easting, northing, _, _ = utm.from_latlon(data["latitude"],
-                                                  data["longitude"])
+        (easting,), (northing,) = projection.project_points([data])
 
         emergent_obj.point.x = easting
         emergent_obj.point.y = northing
@@ -276,7 +424,24 @@ class MissionDeserializer(object):
         return emergent_obj
 
     @classmethod
-    def from_dict(cls, data, frame):
+    def get_projection(cls, data, local=False):
+        """
+        Creates a projection for a mission, in the UTM zone of its home
+        position.
+
+        Args:
+            data: A dictionary.
+            local: Whether to use the home position as the local origin.
+
+        Returns:
+            UTMProjection.
+        """
+        home = data.get("home_pos", data["air_drop_pos"])
+        return UTMProjection.from_latlon(home["latitude"], home["longitude"],
+                                         local)
+
+    @classmethod
+    def from_dict(cls, data, frame, projection=None):
         """
         Deserializes the mission object from a dictionary to several
         ros messages.
@@ -284,6 +449,8 @@ class MissionDeserializer(object):
         Args:
             data: A dictionary.
             frame: frame id for the messages.
+            projection: UTMProjection to project every location with, or None
+                to use the mission's own, see get_projection().
 
         Returns:
             A tuple of (FlyZoneArray, PolygonStamped, Marker, PointStamped,
@@ -291,22 +458,173 @@ class MissionDeserializer(object):
             grid, waypoints, air drop position, off axis target location, and
             the emergent object location.
         """
-        flyzones = cls.__get_flyzone(data["fly_zones"], frame)
-        search_grid = cls.__get_search_grid(data["search_grid_points"], frame)
-        waypoints = cls.__get_waypoints(data["mission_waypoints"], frame)
-        air_drop_pos = cls.__get_airdrop_loc(data["air_drop_pos"], frame)
-        off_axis_targ = cls.__get_offaxis_targ(data["off_axis_target_pos"],
-                                               frame)
-        emergent_obj = cls.__emergent_object(data["emergent_last_known_pos"],
-                                             frame)
+        if projection is None:
+            projection = cls.get_projection(data)
+
+        return tuple(cls.get_field(i, data, frame, projection)
+                     for i in range(len(LazyMission.FIELDS)))
+
+    @classmethod
+    def get_field(cls, index, data, frame, projection):
+        """
+        Deserializes a single field of the mission object.
+
+        Args:
+            index: Index of the field in the tuple returned by from_dict().
+            data: A dictionary.
+            frame: frame id for the message.
+            projection: UTMProjection to project locations with.
+
+        Returns:
+            The corresponding ros message.
+
+        Raises:
+            IndexError: If there is no such field.
+        """
+        if index == 0:
+            return cls.__get_flyzone(data["fly_zones"], frame, projection)
+        elif index == 1:
+            return cls.__get_search_grid(data["search_grid_points"], frame,
+                                         projection)
+        elif index == 2:
+            return cls.__get_waypoints(data["mission_waypoints"], frame,
+                                       projection)
+        elif index == 3:
+            return cls.__get_airdrop_loc(data["air_drop_pos"], frame,
+                                         projection)
+        elif index == 4:
+            return cls.__get_offaxis_targ(data["off_axis_target_pos"], frame,
+                                          projection)
+        elif index == 5:
+            return cls.__emergent_object(data["emergent_last_known_pos"],
+                                         frame, projection)
+        raise IndexError("No mission field {}".format(index))
+
+    @classmethod
+    def from_dict_lazy(cls, data, frame, projection=None):
+        """
+        Wraps the mission object in a view that only deserializes each field
+        when it is first accessed.
+
+        Args:
+            data: A dictionary.
+            frame: frame id for the messages.
+            projection: UTMProjection to project every location with, or None
+                to use the mission's own, see get_projection().
+
+        Returns:
+            A LazyMission.
+        """
+        return LazyMission(data, frame, projection)
+
+
+class LazyMission(collections.Sequence):
+
+    """Mission view that deserializes each field on first access.
+
+    Fields are then memoized. This can be used wherever the tuple returned by
+    MissionDeserializer.from_dict() is, including with negative indices and
+    slices, and its fields can also be accessed by name.
+
+    Attributes:
+        data: Mission dictionary.
+        frame: Frame ID of the messages.
+    """
+
+    # Field names, in the order MissionDeserializer.from_dict() returns them.
+    FIELDS = ("flyzones", "search_grid", "waypoints", "air_drop_pos",
+              "off_axis_targ", "emergent_obj")
+
+    def __init__(self, data, frame, projection=None):
+        """Initializes LazyMission.
+
+        Args:
+            data: Mission dictionary.
+            frame: Frame ID of the messages.
+            projection: UTMProjection to project every location with, or None
+                to use the mission's own, see
+                MissionDeserializer.get_projection().
+        """
+        self.data = data
+        self.frame = frame
+        self._projection = projection
+        self._fields = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, index):
+        """Returns a field, deserializing it if this is its first access.
+
+        Args:
+            index: Index of the field in the tuple returned by
+                MissionDeserializer.from_dict(), or slice of them.
+
+        Returns:
+            The corresponding ros message, or tuple of them for a slice.
+
+        Raises:
+            IndexError: If there is no such field.
+        """
+        if isinstance(index, slice):
+            return tuple(self[i]
+                         for i in range(*index.indices(len(self.FIELDS))))
+
+        if not -len(self.FIELDS) <= index < len(self.FIELDS):
+            raise IndexError("No mission field {}".format(index))
+        if index < 0:
+            index += len(self.FIELDS)
+
+        with self._lock:
+            if index not in self._fields:
+                if self._projection is None:
+                    self._projection = MissionDeserializer.get_projection(
+                        self.data)
+                self._fields[index] = MissionDeserializer.get_field(
+                    index, self.data, self.frame, self._projection)
 
-        return (flyzones, search_grid, waypoints, air_drop_pos,
-                off_axis_targ, emergent_obj)
+            return self._fields[index]
+
+    def __len__(self):
+        """Returns the number of fields."""
+        return len(self.FIELDS)
+
+    def __iter__(self):
+        """Iterates over every field, deserializing them as needed."""
+        for i in range(len(self.FIELDS)):
+            yield self[i]
+
+    def __getattr__(self, name):
+        """Returns a field by name, deserializing it as needed.
+
+        Args:
+            name: Field name, see FIELDS.
+
+        Returns:
+            The corresponding ros message.
+
+        Raises:
+            AttributeError: If there is no such field.
+        """
+        if name in LazyMission.FIELDS:
+            return self[LazyMission.FIELDS.index(name)]
+        raise AttributeError(name)
 
 
 class ObstaclesDeserializer(object):
 
-    """Obstacles message deserializer."""
+    """Obstacles message deserializer.
+
+    An instance keeps a pool of markers per kind of obstacle, keyed by
+    obstacle index, and the MarkerArrays holding them. Every call updates the
+    same messages in place, so that deserializing does not allocate new
+    messages once the pools are large enough. The returned MarkerArrays are
+    therefore only valid until the next call.
+
+    Attributes:
+        frame: Frame ID of every Marker.
+        lifetime: Lifetime of every moving obstacle Marker in seconds.
+        stationary_lifetime: Lifetime of every stationary obstacle Marker in
+            seconds.
+    """
 
     # McGill Robotics red, because we have big egos.
     OBSTACLE_COLOR = ColorRGBA(
@@ -315,78 +633,140 @@ class ObstaclesDeserializer(object):
         b=28 / 255.0,
         a=1.0)
 
-    @classmethod
-    def from_dict(cls, data, frame, lifetime):
-        """Deserializes obstacle data into two MarkerArrays.
+    def __init__(self, frame, lifetime, stationary_lifetime=None):
+        """Initializes ObstaclesDeserializer.
 
         Args:
-            data: A dictionary.
             frame: Frame ID of every Marker.
-            lifetime: Lifetime of every Marker in seconds.
+            lifetime: Lifetime of every moving obstacle Marker in seconds.
+            stationary_lifetime: Lifetime of every stationary obstacle Marker
+                in seconds, or None for the same as moving obstacles.
+        """
+        self.frame = frame
+        self.lifetime = lifetime
+        if stationary_lifetime is None:
+            stationary_lifetime = lifetime
+        self.stationary_lifetime = stationary_lifetime
+
+        # Shared by every Marker.
+        self._header = Header(frame_id=frame)
+        self._lifetime = rospy.Duration(lifetime)
+        self._stationary_lifetime = rospy.Duration(stationary_lifetime)
+
+        self._moving_pool = []
+        self._stationary_pool = []
+        self._moving = MarkerArray()
+        self._stationary = MarkerArray()
+
+    def __get_markers(self, array, pool, count, type, ns, lifetime):
+        """Resizes a MarkerArray to a number of markers from a pool.
+
+        Args:
+            array: MarkerArray to resize.
+            pool: List of previously allocated markers.
+            count: Number of markers needed.
+            type: Type of new markers.
+            ns: Namespace of new markers.
+            lifetime: Lifetime of new markers.
+
+        Returns:
+            The list of markers of the MarkerArray.
+        """
+        # Only allocate markers for obstacles never seen before.
+        while len(pool) < count:
+            marker = Marker()
+            marker.header = self._header
+            marker.id = len(pool)
+            marker.type = type
+            marker.color = self.OBSTACLE_COLOR
+            marker.ns = ns
+            marker.lifetime = lifetime
+            pool.append(marker)
+
+        if len(array.markers) != count:
+            array.markers = pool[:count]
+
+        return array.markers
+
+    def deserialize(self, data, projection=None):
+        """Deserializes obstacle data into the two MarkerArrays.
+
+        Args:
+            data: A dictionary.
+            projection: UTMProjection to project every obstacle with, or None
+                to use the UTM zone of the first obstacle.
 
         Returns:
             Tuple of two visualization_msgs/MarkerArray, MarkerArray) tuple.
             The first is of moving obstacles, and the latter is of stationary
             obstacles.
         """
-        # Generate base header.
-        header = Header()
-        header.stamp = rospy.get_rostime()
-        header.frame_id = frame
+        # Update base header.
+        self._header.stamp = rospy.get_rostime()
 
-        # Parse moving obstacles, and populate markers with spheres.
-        moving_obstacles = MarkerArray()
-        if "moving_obstacles" in data:
-            for obj in data["moving_obstacles"]:
-                # Moving obstacles are spheres.
-                marker = Marker()
-                marker.header = header
-                marker.type = Marker.SPHERE
-                marker.color = cls.OBSTACLE_COLOR
-                marker.ns = "moving_obstacles"
-                marker.lifetime = rospy.Duration(lifetime)
+        moving = data.get("moving_obstacles", [])
+        stationary = data.get("stationary_obstacles", [])
+        if projection is None and (moving or stationary):
+            first = (moving or stationary)[0]
+            projection = UTMProjection.from_latlon(first["latitude"],
+                                                   first["longitude"])
 
+        # Parse moving obstacles, and populate markers with spheres.
+        markers = self.__get_markers(self._moving, self._moving_pool,
+                                     len(moving), Marker.SPHERE,
+                                     "moving_obstacles", self._lifetime)
+        if moving:
+            # Convert latitudes and longitudes to UTM all at once.
+            eastings, northings = projection.project_points(moving)
+            for marker, obj, easting, northing in zip(markers, moving,
+                                                      eastings, northings):
                 # Set scale as radius.
                 radius = feet_to_meters(obj["sphere_radius"])
                 marker.scale.x = marker.scale.y = marker.scale.z = radius
 
-                # Convert latitude and longitude to UTM.
-                easting, northing, _, _ = utm.from_latlon(obj["latitude"],
-                                                          obj["longitude"])
                 marker.pose.position.x = easting
                 marker.pose.position.y = northing
                 marker.pose.position.z = feet_to_meters(obj["altitude_msl"])
 
-                moving_obstacles.markers.append(marker)
-
         # Parse stationary obstacles, and populate markers with cylinders.
-        stationary_obstacles = MarkerArray()
-        if "stationary_obstacles" in data:
-            for obj in data["stationary_obstacles"]:
-                # Stationary obstacles are cylinders.
-                marker = Marker()
-                marker.header = header
-                marker.type = Marker.CYLINDER
-                marker.color = cls.OBSTACLE_COLOR
-                marker.ns = "stationary_obstacles"
-                marker.lifetime = rospy.Duration(lifetime)
-
+        markers = self.__get_markers(self._stationary, self._stationary_pool,
+                                     len(stationary), Marker.CYLINDER,
+                                     "stationary_obstacles",
+                                     self._stationary_lifetime)
+        if stationary:
+            # Convert latitudes and longitudes to UTM all at once.
+            eastings, northings = projection.project_points(stationary)
+            for marker, obj, easting, northing in zip(markers, stationary,
+                                                      eastings, northings):
                 # Set scale to define size.
                 radius = feet_to_meters(obj["cylinder_radius"])
                 height = feet_to_meters(obj["cylinder_height"])
                 marker.scale.x = marker.scale.y = radius
                 marker.scale.z = height
 
-                # Convert latitude and longitude to UTM.
-                easting, northing, _, _ = utm.from_latlon(obj["latitude"],
-                                                          obj["longitude"])
                 marker.pose.position.x = easting
                 marker.pose.position.y = northing
                 marker.pose.position.z = height / 2
 
-                stationary_obstacles.markers.append(marker)
+        return (self._moving, self._stationary)
 
-        return (moving_obstacles, stationary_obstacles)
+    @classmethod
+    def from_dict(cls, data, frame, lifetime, projection=None):
+        """Deserializes obstacle data into two new MarkerArrays.
+
+        Args:
+            data: A dictionary.
+            frame: Frame ID of every Marker.
+            lifetime: Lifetime of every Marker in seconds.
+            projection: UTMProjection to project every obstacle with, or None
+                to use the UTM zone of the first obstacle.
+
+        Returns:
+            Tuple of two visualization_msgs/MarkerArray, MarkerArray) tuple.
+            The first is of moving obstacles, and the latter is of stationary
+            obstacles.
+        """
+        return cls(frame, lifetime).deserialize(data, projection)
 
 
 class TelemetrySerializer(object):
@@ -474,10 +854,42 @@ class TargetSerializer(object):
 
 class TargetImageSerializer(object):
 
-    """Target image message serializer."""
+    """Target image message serializer.
+
+    An instance keeps its CvBridge and encoding parameters between calls, and
+    is safe to share between threads. The from_msg() and from_raw() class
+    methods use a shared default instance.
+
+    Attributes:
+        bridge: CvBridge used to convert between ROS and OpenCV images.
+        encode_params: OpenCV PNG encoding parameters.
+    """
+
+    # Shared default instance, created on first use.
+    _default = None
+
+    def __init__(self, compression=9):
+        """Initializes TargetImageSerializer.
+
+        Args:
+            compression: PNG compression level, from 0 (fastest) to 9
+                (smallest).
+        """
+        self.bridge = CvBridge()
+        self.encode_params = [cv2.IMWRITE_PNG_COMPRESSION, compression]
 
     @classmethod
-    def from_msg(cls, msg):
+    def default(cls):
+        """Returns the shared default serializer.
+
+        Returns:
+            TargetImageSerializer.
+        """
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def serialize(self, msg):
         """Serializes a ROS Image message into a compressed PNG image.
 
         Args:
@@ -490,23 +902,20 @@ class TargetImageSerializer(object):
             CvBridgeError: On image conversion error.
         """
         # Convert ROS Image to OpenCV image.
-        bridge = CvBridge()
-        img = bridge.imgmsg_to_cv2(msg)
+        img = self.bridge.imgmsg_to_cv2(msg)
 
-        # Convert to PNG with highest level of compression to limit bandwidth
-        # usage. PNG is used since it is a lossless format, so this can later
-        # be retrieved as a ROS image without issue.
-        compression = [cv2.IMWRITE_PNG_COMPRESSION, 9]
-        png = cv2.imencode(".png", img, compression)[1].tostring()
+        # Convert to PNG. PNG is used since it is a lossless format, so this
+        # can later be retrieved as a ROS image without issue.
+        png = cv2.imencode(".png", img, self.encode_params)[1].tobytes()
 
         return png
 
-    @classmethod
-    def from_raw(cls, raw):
+    def deserialize(self, raw):
         """Deserializes binary-encoded image data into a ROS Image message.
 
         Args:
-            raw: Binary encoded image data.
+            raw: Binary encoded image data, as a string or any object
+                supporting the buffer interface such as an mmap.
 
         Returns:
             ROS Image message.
@@ -514,12 +923,143 @@ class TargetImageSerializer(object):
         Raises:
             CvBridgeError: On image conversion error.
         """
-        # Convert to OpenCV image.
-        nparr = np.fromstring(raw, np.uint8)
+        # Convert to OpenCV image without copying the encoded data.
+        nparr = np.frombuffer(raw, np.uint8)
         img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
         # Convert to ROS message.
-        bridge = CvBridge()
-        msg = bridge.cv2_to_imgmsg(img)
+        msg = self.bridge.cv2_to_imgmsg(img)
+
+        return msg
+
+    def recompress(self, raw):
+        """Recompresses an encoded image into a PNG image with this
+        serializer's compression level.
+
+        Args:
+            raw: Binary encoded image data, as a string or any object
+                supporting the buffer interface.
+
+        Returns:
+            Compressed PNG image, or the image as is if it is not a PNG image.
+
+        Raises:
+            ValueError: If the image could not be decoded.
+        """
+        # Other formats, i.e. JPEG, are already smaller than any PNG.
+        if CompressedTargetImageSerializer.get_format(raw) != "png":
+            return raw
+
+        nparr = np.frombuffer(raw, np.uint8)
+        img = cv2.imdecode(nparr, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            raise ValueError("Could not decode image")
+
+        return cv2.imencode(".png", img, self.encode_params)[1].tobytes()
+
+    @classmethod
+    def from_msg(cls, msg):
+        """Serializes a ROS Image message into a compressed PNG image with the
+        highest level of compression to limit bandwidth usage.
+
+        Args:
+            msg: ROS Image message.
+
+        Returns:
+            Compressed PNG image.
+
+        Raises:
+            CvBridgeError: On image conversion error.
+        """
+        return cls.default().serialize(msg)
+
+    @classmethod
+    def from_raw(cls, raw):
+        """Deserializes binary-encoded image data into a ROS Image message.
+
+        Args:
+            raw: Binary encoded image data, as a string or any object
+                supporting the buffer interface such as an mmap.
+
+        Returns:
+            ROS Image message.
+
+        Raises:
+            CvBridgeError: On image conversion error.
+        """
+        return cls.default().deserialize(raw)
+
+
+class CompressedTargetImageSerializer(object):
+
+    """Target compressed image message serializer.
+
+    Images that are already encoded as PNG or JPEG are passed through as is,
+    without being decoded or reencoded.
+    """
+
+    # File signatures of the supported formats.
+    SIGNATURES = (
+        ("png", b"\x89PNG\r\n\x1a\n"),
+        ("jpeg", b"\xff\xd8\xff"),
+    )
+
+    @classmethod
+    def get_format(cls, raw):
+        """Determines the format of encoded image data from its signature.
+
+        Args:
+            raw: Binary encoded image data.
+
+        Returns:
+            "png" or "jpeg", or None if the format is not supported.
+        """
+        for format, signature in cls.SIGNATURES:
+            if raw[:len(signature)] == signature:
+                return format
+
+        return None
+
+    @classmethod
+    def from_msg(cls, msg):
+        """Serializes a ROS CompressedImage message.
+
+        Args:
+            msg: ROS CompressedImage message.
+
+        Returns:
+            Tuple of the encoded image and its format, "png" or "jpeg".
+
+        Raises:
+            ValueError: If the image is neither a PNG nor a JPEG image.
+        """
+        format = cls.get_format(msg.data)
+        if format is None:
+            raise ValueError(
+                "Unsupported image format: {}".format(msg.format))
+
+        return msg.data, format
+
+    @classmethod
+    def from_raw(cls, raw):
+        """Deserializes binary-encoded image data into a ROS CompressedImage
+        message.
+
+        Args:
+            raw: Binary encoded image data.
+
+        Returns:
+            ROS CompressedImage message.
+
+        Raises:
+            ValueError: If the image is neither a PNG nor a JPEG image.
+        """
+        format = cls.get_format(raw)
+        if format is None:
+            raise ValueError("Unsupported image format")
+
+        msg = CompressedImage()
+        msg.format = format
+        msg.data = raw
 
         return msg
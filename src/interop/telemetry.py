@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+"""Telemetry synchronization and asynchronous uploading."""
+
+import time
+import rospy
+import threading
+import collections
+import message_filters
+from simplejson import JSONDecodeError
+from requests.exceptions import ConnectionError, RequestException, Timeout
+
+
+class TelemetryUploader(object):
+
+    """Uploads telemetry to the interop server from a background worker.
+
+    Samples are pushed onto a bounded queue by the synchronizer callback and
+    drained by a dedicated worker thread, so a slow HTTP round trip never
+    blocks message ingestion. When the queue is full, the oldest sample is
+    dropped in favor of the newest one.
+
+    Attributes:
+        client: Interoperability client used to upload telemetry.
+        queue_size: Maximum number of samples waiting to be uploaded.
+        uploaded: Number of samples successfully uploaded.
+        failed: Number of samples that failed to upload.
+        dropped: Number of samples dropped because the queue was full.
+    """
+
+    def __init__(self, client, queue_size=1):
+        """Initializes TelemetryUploader.
+
+        Note: the uploader must be start()ed before samples are uploaded.
+
+        Args:
+            client (interop.InteroperabilityClient): Interoperability client
+                that will be used to upload the telemetry.
+            queue_size (int): Maximum number of pending samples.
+        """
+        if queue_size < 1:
+            raise ValueError("Queue size must be at least 1")
+
+        self.client = client
+        self.queue_size = queue_size
+
+        self.uploaded = 0
+        self.failed = 0
+        self.dropped = 0
+
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._running = False
+        self._worker = None
+
+        # Used to compute the achieved upload rate between calls to stats().
+        self._last_stats_time = time.time()
+        self._last_stats_uploaded = 0
+
+    def start(self):
+        """Starts the background upload worker."""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+
+        self._worker = threading.Thread(target=self._run,
+                                        name="telemetry_uploader")
+        self._worker.daemon = True
+        self._worker.start()
+
+    def stop(self, timeout=None):
+        """Stops the background upload worker.
+
+        Pending samples are discarded.
+
+        Args:
+            timeout (float): Maximum time in seconds to wait for the worker to
+                finish its current upload, or None to wait indefinitely.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+
+    def put(self, navsat_msg, compass_msg):
+        """Queues a telemetry sample for upload.
+
+        This never blocks on the network.
+
+        Args:
+            navsat_msg: sensor_msgs/NavSatFix message.
+            compass_msg: std_msgs/Float64 message in degrees.
+        """
+        with self._condition:
+            # Latest wins: drop the oldest sample when full.
+            while len(self._queue) >= self.queue_size:
+                self._queue.popleft()
+                self.dropped += 1
+
+            self._queue.append((navsat_msg, compass_msg))
+            self._condition.notify()
+
+    @property
+    def depth(self):
+        """Number of samples currently waiting to be uploaded."""
+        with self._condition:
+            return len(self._queue)
+
+    def stats(self):
+        """Returns upload statistics since the last call.
+
+        Returns:
+            dict: With the achieved upload rate in Hz ("rate"), the current
+            queue depth ("depth"), and the cumulative "uploaded", "failed"
+            and "dropped" sample counts.
+        """
+        with self._condition:
+            now = time.time()
+            elapsed = now - self._last_stats_time
+            uploaded = self.uploaded - self._last_stats_uploaded
+            rate = uploaded / elapsed if elapsed > 0 else 0.0
+
+            self._last_stats_time = now
+            self._last_stats_uploaded = self.uploaded
+
+            return {
+                "rate": rate,
+                "depth": len(self._queue),
+                "uploaded": self.uploaded,
+                "failed": self.failed,
+                "dropped": self.dropped
+            }
+
+    def _run(self):
+        """Drains the queue until stopped."""
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+
+                if not self._running:
+                    return
+
+                navsat_msg, compass_msg = self._queue.popleft()
+
+            try:
+                self.client.post_telemetry(navsat_msg, compass_msg)
+            except (ConnectionError, Timeout) as e:
+                rospy.logwarn(e)
+                success = False
+            except (JSONDecodeError, RequestException) as e:
+                rospy.logerr(e)
+                success = False
+            except Exception as e:
+                # Keep the worker alive no matter what, otherwise no more
+                # telemetry would be uploaded for the rest of the flight.
+                rospy.logerr("Unexpected error uploading telemetry: %r", e)
+                success = False
+            else:
+                success = True
+
+            with self._condition:
+                if success:
+                    self.uploaded += 1
+                else:
+                    self.failed += 1
+
+
+class UnstampedTimeSynchronizer(message_filters.ApproximateTimeSynchronizer):
+
+    """Synchronizes messages by order of arrival.
+
+    This is to allow synchronization between a mixture of stamped and
+    unstamped messages. Only to be used when the rate is approximately the
+    same.
+
+    Every input keeps a deque of (receipt time, message) pairs, which is sorted
+    by construction since messages are appended as they are received. Like
+    message_filters' ApproximateTime policy, a head is dropped whenever the
+    message behind it is closer to the other heads, so the freshest set is
+    matched even when the inputs run at different rates. Every message is
+    dropped or matched at most once, so adding a message costs amortized
+    constant time per input regardless of the queue size.
+    """
+
+    def add(self, msg, my_queue, my_queue_index=None):
+        """Adds a message to the current queue, and matches them accordingly.
+
+        Args:
+            msg: Message.
+            my_queue: Current message queue, as set up by the base class.
+            my_queue_index: Index of the current message queue, if known.
+        """
+        # Store when this message was received.
+        received = rospy.get_rostime()
+
+        with self.lock:
+            # Lazily set up the deques, one per input, in the same order as
+            # the base class' queues.
+            if not hasattr(self, "_deques"):
+                self._deques = [collections.deque() for _ in self.queues]
+
+            if my_queue_index is None:
+                my_queue_index = next(i for i, q in enumerate(self.queues)
+                                      if q is my_queue)
+            deque = self._deques[my_queue_index]
+
+            # Start over if time jumped backwards, since the deques would no
+            # longer be sorted.
+            if deque and received < deque[-1][0]:
+                for d in self._deques:
+                    d.clear()
+
+            # Add to queue.
+            deque.append((received, msg))
+            if len(deque) > self.queue_size:
+                deque.popleft()
+
+            self._match()
+
+    def _match(self):
+        """Signals every set of messages within the allowed delay.
+
+        Must be called with the lock held.
+        """
+        deques = self._deques
+        while all(deques):
+            self._prune()
+            heads = [d[0][0] for d in deques]
+            oldest = min(heads)
+
+            if max(heads) - oldest < self.slop:
+                msgs = [d.popleft()[1] for d in deques]
+                self.signalMessage(*msgs)
+                continue
+
+            # The oldest message is too far from the head of some other
+            # queue, and every message behind that head is newer still, so it
+            # can never be matched: drop it.
+            deques[heads.index(oldest)].popleft()
+
+    def _prune(self):
+        """Drops every head that a newer message in its deque is closer to
+        the other heads than, so that the best set is matched rather than the
+        oldest one.
+
+        Must be called with the lock held, and with no deque empty.
+        """
+        deques = self._deques
+        pruned = True
+        while pruned:
+            pruned = False
+            for i, d in enumerate(deques):
+                # The newest of the other heads must be part of any set they
+                # are matched in.
+                pivot = max(other[0][0] for j, other in enumerate(deques)
+                            if j != i)
+                while (len(d) > 1 and
+                       abs(d[1][0] - pivot) <= abs(d[0][0] - pivot)):
+                    d.popleft()
+                    pruned = True
@@ -3,6 +3,7 @@
 """Interoperability mock server for testing."""
 
 import json
+import time
 import responses
 from interop import serializers
 
@@ -108,18 +109,86 @@ class InteroperabilityMockServer(object):
                       status=code, body=content if code == 200 else "",
                       content_type="application/json")
 
-    def set_get_obstacles_response(self, obstacles, code=200):
+    def _add_conditional_get(self, uri, content, code, etag, last_modified):
+        """Sets mock GET response that supports conditional requests.
+
+        Args:
+            uri (str): Server URI.
+            content (str): Body to respond with.
+            code (int): Status code to respond with.
+            etag (str): ETag to respond with, or None.
+            last_modified (str): Last-Modified date to respond with, or None.
+        """
+        headers = {}
+        if etag:
+            headers["ETag"] = etag
+        if last_modified:
+            headers["Last-Modified"] = last_modified
+
+        def callback(request):
+            if code != 200:
+                return (code, {}, "")
+
+            # Respond with 304 Not Modified if any validator matches.
+            if ((etag and request.headers.get("If-None-Match") == etag) or
+                    (last_modified and
+                     request.headers.get("If-Modified-Since") ==
+                     last_modified)):
+                return (304, headers, "")
+
+            return (200, headers, content)
+
+        self.rsps.add_callback(responses.GET, self.url + uri,
+                               callback=callback,
+                               content_type="application/json")
+
+    def set_get_obstacles_response(self, obstacles, code=200, etag=None,
+                                   last_modified=None):
         """Sets mock GET /api/obstacles response.
 
         Args:
             obstacles (dict): Obstacles to respond with.
             code (int): Status code to respond with.
+            etag (str): ETag to respond with, or None.
+            last_modified (str): Last-Modified date to respond with, or None.
         """
         content = json.dumps(obstacles)
+        if etag or last_modified:
+            self._add_conditional_get("/api/obstacles", content, code, etag,
+                                      last_modified)
+            return
+
         self.rsps.add(responses.GET, self.url + "/api/obstacles", status=code,
                       body=content if code == 200 else "",
                       content_type="application/json")
 
+    def set_get_missions_response(self, missions, code=200, etag=None,
+                                  last_modified=None):
+        """Sets mock GET /api/missions response.
+
+        Args:
+            missions (list): Missions to respond with.
+            code (int): Status code to respond with.
+            etag (str): ETag to respond with, or None.
+            last_modified (str): Last-Modified date to respond with, or None.
+        """
+        self._add_conditional_get("/api/missions", json.dumps(missions), code,
+                                  etag, last_modified)
+
+    def set_get_mission_response(self, mission, code=200, etag=None,
+                                 last_modified=None):
+        """Sets mock GET /api/missions/<id> response.
+
+        Args:
+            mission (dict): Mission to respond with.
+            code (int): Status code to respond with.
+            etag (str): ETag to respond with, or None.
+            last_modified (str): Last-Modified date to respond with, or None.
+        """
+        self._add_conditional_get("/api/missions/{:d}".format(mission["id"]),
+                                  json.dumps(mission), code, etag,
+                                  last_modified)
+
     def set_telemetry_response(self, code=200):
         """Sets mock POST /api/telemetry response.
 
@@ -130,7 +199,8 @@ class InteroperabilityMockServer(object):
                       body="UAS Telemetry Successfully Posted."
                            if code == 200 else "")
 
-    def set_post_target_response(self, target, id, user=1, code=200):
+    def set_post_target_response(self, target, id, user=1, code=200,
+                                 delay=0):
         """Sets mock POST /api/targets response.
 
         Args:
@@ -138,10 +208,22 @@ class InteroperabilityMockServer(object):
             id (int): Target ID to return.
             user (int): User number to respond with.
             code (int): Status code to respond with.
+            delay (float): Time in seconds to wait before responding, to
+                simulate a slow server.
         """
         target.update({"id": id, "user": user})
         content = json.dumps(target)
 
+        if delay:
+            def callback(request):
+                time.sleep(delay)
+                return (code, {}, content if code == 200 else "")
+
+            self.rsps.add_callback(responses.POST, self.url + "/api/targets",
+                                   callback=callback,
+                                   content_type="application/json")
+            return
+
         self.rsps.add(responses.POST, self.url + "/api/targets", status=code,
                       body=content if code == 200 else "",
                       content_type="application/json")
@@ -5,14 +5,17 @@
 
 import rospy
 import rosunit
+import tempfile
 import numpy as np
 from unittest import TestCase
 from cv_bridge import CvBridge
 from std_msgs.msg import Float64
 from sensor_msgs.msg import NavSatFix
-from interop.client import InteroperabilityClient
+from requests.exceptions import HTTPError
+from interop.client import Backoff, InteroperabilityClient
 from mock_server import InteroperabilityMockServer
-from interop.serializers import TargetSerializer, TargetImageSerializer
+from interop.serializers import (TargetSerializer, TargetImageSerializer,
+                                 UTMProjection)
 
 
 class TestInteroperabilityClient(TestCase):
@@ -67,6 +70,79 @@ class TestInteroperabilityClient(TestCase):
             client.login()
             client.get_obstacles("odom", 1.0)
 
+            # Project obstacles relative to a local origin.
+            client.projection = UTMProjection.from_latlon(38.14792,
+                                                          -76.427995, True)
+            server.set_get_obstacles_response(json)
+            moving, stationary = client.get_obstacles("odom", 1.0)
+            for marker in moving.markers + stationary.markers:
+                self.assertLess(abs(marker.pose.position.x), 2000)
+                self.assertLess(abs(marker.pose.position.y), 2000)
+
+    def test_reauthentication_keeps_pool(self):
+        """Tests that an expired session is renewed without dropping the
+        connection pool."""
+        # Set up test data.
+        url = "http://interop"
+        client_args = (url, "testuser", "testpass", 1.0)
+        json = {"moving_obstacles": [], "stationary_obstacles": []}
+
+        with InteroperabilityMockServer(url) as server:
+            # Setup mock server to expire the session once.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_get_obstacles_response(json, code=403)
+            server.set_get_obstacles_response(json)
+
+            # Connect client.
+            client = InteroperabilityClient(*client_args, pool_maxsize=2)
+            client.wait_for_server()
+            client.login()
+
+            session = client.session
+            adapter = client.session.get_adapter(url)
+            self.assertEqual(adapter._pool_maxsize, 2)
+
+            client.get_obstacles("odom", 1.0)
+
+            # Verify the same session and pool were reused.
+            self.assertIs(client.session, session)
+            self.assertIs(client.session.get_adapter(url), adapter)
+
+    def test_backoff(self):
+        """Tests delays grow up to the cap and are jittered."""
+        backoff = Backoff(initial=1.0, maximum=4.0, multiplier=2.0,
+                          jitter=0.5)
+        delays = backoff.delays()
+        for expected in (1.0, 2.0, 4.0, 4.0, 4.0):
+            delay = next(delays)
+            self.assertLessEqual(delay, expected)
+            self.assertGreaterEqual(delay, expected / 2)
+
+    def test_wait_for_server_backs_off(self):
+        """Tests the client retries until the server is reachable, but does
+        not retry rejected credentials."""
+        # Set up test data.
+        url = "http://interop"
+        client_args = (url, "testuser", "testpass", 1.0)
+        backoff = Backoff(initial=0.01, maximum=0.02)
+
+        with InteroperabilityMockServer(url) as server:
+            # Setup mock server to be unavailable at first.
+            server.set_root_response(code=503)
+            server.set_root_response(code=503)
+            server.set_root_response()
+            server.set_login_response(success=False)
+
+            # Connect client.
+            client = InteroperabilityClient(*client_args, backoff=backoff)
+            client.wait_for_server()
+            self.assertEqual(len(server.rsps.calls), 3)
+
+            with self.assertRaises(HTTPError):
+                client.login()
+            self.assertEqual(len(server.rsps.calls), 4)
+
     def test_post_telemetry(self):
         """Tests posting telemetry data through client."""
         # Set up test data.
@@ -210,6 +286,332 @@ class TestInteroperabilityClient(TestCase):
             client.get_target_image(target_id)
             client.delete_target_image(target_id)
 
+    def test_conditional_get(self):
+        """Tests unchanged obstacles and missions are served from cache."""
+        # Set up test data.
+        url = "http://interop"
+        client_args = (url, "testuser", "testpass", 1.0)
+        obstacles = {
+            "moving_obstacles": [],
+            "stationary_obstacles": [{
+                "cylinder_height": 750.0,
+                "cylinder_radius": 300.0,
+                "latitude": 38.140578,
+                "longitude": -76.428997
+            }]
+        }
+        position = {"latitude": 38.14792, "longitude": -76.427995}
+        mission = {
+            "id": 1,
+            "active": True,
+            "home_pos": position,
+            "air_drop_pos": position,
+            "off_axis_target_pos": position,
+            "emergent_last_known_pos": position,
+            "fly_zones": [],
+            "mission_waypoints": [],
+            "search_grid_points": []
+        }
+
+        with InteroperabilityMockServer(url) as server:
+            # Setup mock server.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_get_obstacles_response(obstacles, etag='"1"')
+            server.set_get_missions_response(
+                [mission], last_modified="Wed, 21 Oct 2015 07:28:00 GMT")
+            server.set_get_mission_response(mission, etag='"1"')
+
+            # Connect client.
+            client = InteroperabilityClient(*client_args)
+            client.wait_for_server()
+            client.login()
+
+            # The second request of each is conditional, and the server
+            # responds that nothing changed.
+            for get in (lambda: client.get_obstacles("odom", 1.0),
+                        lambda: client.get_active_mission("map"),
+                        lambda: client.get_mission(1, "map")):
+                first = get()
+                second = get()
+                self.assertIs(first, second)
+                self.assertEqual(server.rsps.calls[-1].response.status_code,
+                                 304)
+
+    def test_unchanged_content(self):
+        """Tests unchanged responses are not deserialized again, even without
+        validators."""
+        # Set up test data.
+        url = "http://interop"
+        client_args = (url, "testuser", "testpass", 1.0)
+        obstacles = {"moving_obstacles": [], "stationary_obstacles": []}
+        changed = {
+            "moving_obstacles": [],
+            "stationary_obstacles": [{
+                "cylinder_height": 750.0,
+                "cylinder_radius": 300.0,
+                "latitude": 38.140578,
+                "longitude": -76.428997
+            }]
+        }
+
+        with InteroperabilityMockServer(url) as server:
+            # Setup mock server.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_get_obstacles_response(obstacles)
+            server.set_get_obstacles_response(obstacles)
+            server.set_get_obstacles_response(changed)
+
+            # Connect client.
+            client = InteroperabilityClient(*client_args)
+            client.wait_for_server()
+            client.login()
+
+            first = client.get_obstacles("odom", 1.0)
+            self.assertIs(client.get_obstacles("odom", 1.0), first)
+
+            _, stationary = client.get_obstacles("odom", 1.0)
+            self.assertEqual(len(stationary.markers), 1)
+
+    def test_cache_eviction(self):
+        """Tests only the last result is cached for each URI."""
+        # Set up test data.
+        url = "http://interop"
+        client_args = (url, "testuser", "testpass", 1.0)
+        obstacles = {"moving_obstacles": [], "stationary_obstacles": []}
+
+        with InteroperabilityMockServer(url) as server:
+            # Setup mock server.
+            server.set_root_response()
+            server.set_login_response()
+            for _ in range(3):
+                server.set_get_obstacles_response(obstacles, etag='"1"')
+
+            # Connect client.
+            client = InteroperabilityClient(*client_args)
+            client.wait_for_server()
+            client.login()
+
+            # Results for other arguments replace the cached one.
+            for frame in ("odom", "map", "odom"):
+                client.get_obstacles(frame, 1.0)
+                self.assertEqual(
+                    server.rsps.calls[-1].response.status_code, 200)
+                self.assertEqual(len(client._InteroperabilityClient__cache),
+                                 1)
+
+    def test_active_mission_fast_path(self):
+        """Tests only the active mission is requested once it is known."""
+        # Set up test data.
+        url = "http://interop"
+        client_args = (url, "testuser", "testpass", 1.0)
+        position = {"latitude": 38.14792, "longitude": -76.427995}
+
+        def make_mission(id, active):
+            return {
+                "id": id,
+                "active": active,
+                "home_pos": position,
+                "air_drop_pos": position,
+                "off_axis_target_pos": position,
+                "emergent_last_known_pos": position,
+                "fly_zones": [],
+                "mission_waypoints": [],
+                "search_grid_points": []
+            }
+
+        with InteroperabilityMockServer(url) as server:
+            # Setup mock server. Mission 2 is active, then mission 1.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_get_missions_response(
+                [make_mission(1, False), make_mission(2, True)])
+            server.set_get_missions_response(
+                [make_mission(1, True), make_mission(2, False)])
+            server.set_get_mission_response(make_mission(2, True))
+            server.set_get_mission_response(make_mission(2, False))
+
+            # Connect client.
+            client = InteroperabilityClient(*client_args)
+            client.wait_for_server()
+            client.login()
+
+            for _ in range(3):
+                client.get_active_mission("map")
+
+            uris = [call.request.url[len(url):]
+                    for call in server.rsps.calls[2:]]
+            self.assertEqual(uris, ["/api/missions", "/api/missions/2",
+                                    "/api/missions/2", "/api/missions"])
+
+    def test_active_mission_errors(self):
+        """Tests only missing missions fall back to listing all missions."""
+        # Set up test data.
+        url = "http://interop"
+        client_args = (url, "testuser", "testpass", 1.0)
+        position = {"latitude": 38.14792, "longitude": -76.427995}
+        mission = {
+            "id": 1,
+            "active": True,
+            "home_pos": position,
+            "air_drop_pos": position,
+            "off_axis_target_pos": position,
+            "emergent_last_known_pos": position,
+            "fly_zones": [],
+            "mission_waypoints": [],
+            "search_grid_points": []
+        }
+
+        with InteroperabilityMockServer(url) as server:
+            # Setup mock server to fail, then to lose the mission.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_get_missions_response([mission])
+            server.set_get_mission_response(mission, code=503)
+            server.set_get_mission_response(mission)
+            server.set_get_mission_response(mission, code=404)
+            server.set_get_missions_response([mission])
+
+            # Connect client.
+            client = InteroperabilityClient(*client_args)
+            client.wait_for_server()
+            client.login()
+
+            client.get_active_mission("map")
+            with self.assertRaises(HTTPError):
+                client.get_active_mission("map")
+            client.get_active_mission("map")
+            client.get_active_mission("map")
+
+            uris = [call.request.url[len(url):]
+                    for call in server.rsps.calls[2:]]
+            self.assertEqual(uris, ["/api/missions", "/api/missions/1",
+                                    "/api/missions/1", "/api/missions/1",
+                                    "/api/missions"])
+
+    def test_mission_projection(self):
+        """Tests the projection follows the mission retrieved last, unless one
+        is configured."""
+        # Set up test data.
+        url = "http://interop"
+        client_args = (url, "testuser", "testpass", 1.0)
+
+        def make_mission(id, latitude, longitude):
+            position = {"latitude": latitude, "longitude": longitude}
+            return {
+                "id": id,
+                "active": True,
+                "home_pos": position,
+                "air_drop_pos": position,
+                "off_axis_target_pos": position,
+                "emergent_last_known_pos": position,
+                "fly_zones": [],
+                "mission_waypoints": [],
+                "search_grid_points": []
+            }
+
+        maryland = make_mission(1, 38.14792, -76.427995)
+        sydney = make_mission(2, -33.856159, 151.215256)
+
+        with InteroperabilityMockServer(url) as server:
+            # Setup mock server.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_get_mission_response(maryland, etag='"1"')
+            server.set_get_mission_response(sydney)
+            server.set_get_mission_response(maryland, etag='"1"')
+            server.set_get_mission_response(sydney)
+
+            # Connect client.
+            client = InteroperabilityClient(*client_args)
+            client.wait_for_server()
+            client.login()
+
+            client.get_mission(1, "map")
+            self.assertEqual(client.projection.zone_number, 18)
+
+            client.get_mission(2, "map")
+            self.assertEqual(client.projection.zone_number, 56)
+
+            # Also switches back when the mission did not change.
+            client.get_mission(1, "map")
+            self.assertEqual(server.rsps.calls[-1].response.status_code, 304)
+            self.assertEqual(client.projection.zone_number, 18)
+
+            # A configured projection is kept.
+            client = InteroperabilityClient(
+                *client_args, projection=UTMProjection(18))
+            client.get_mission(2, "map")
+            self.assertEqual(client.projection.zone_number, 18)
+
+    def test_streamed_target_image(self):
+        """Tests streaming target images with progress reports."""
+        # Set up test data.
+        url = "http://interop"
+        client_args = (url, "testuser", "testpass", 1.0)
+        target_id = 1
+
+        nparr = np.random.randint(0, 256, (400, 300, 3)).astype(np.uint8)
+        ros_img = CvBridge().cv2_to_imgmsg(nparr)
+        img = TargetImageSerializer.from_msg(ros_img)
+
+        with InteroperabilityMockServer(url) as server:
+            # Setup mock server.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_post_target_image_response(target_id)
+            server.set_post_target_image_response(target_id)
+            server.set_get_target_image_response(target_id, img, "image/png")
+
+            # Connect client.
+            client = InteroperabilityClient(*client_args)
+            client.wait_for_server()
+            client.login()
+
+            # Upload from a file.
+            uploaded = []
+            f = tempfile.TemporaryFile()
+            try:
+                f.write(img)
+                f.seek(0)
+                client.post_target_image(
+                    target_id, f, lambda n, total: uploaded.append((n, total)))
+            finally:
+                f.close()
+
+            # Upload from the middle of a file.
+            offset = []
+            f = tempfile.TemporaryFile()
+            try:
+                f.write(b"header" + img)
+                f.seek(len(b"header"))
+                client.post_target_image(
+                    target_id, f, lambda n, total: offset.append((n, total)))
+            finally:
+                f.close()
+            self.assertEqual(
+                server.rsps.calls[-1].request.headers["Content-Length"],
+                str(len(img)))
+            self.assertEqual(offset[-1], (len(img), len(img)))
+
+            # Upload from an iterator of chunks.
+            chunks = (img[i:i + 1024] for i in range(0, len(img), 1024))
+            client.post_target_image(target_id, chunks)
+
+            # Download.
+            downloaded = []
+            msg = client.get_target_image(
+                target_id, lambda n, total: downloaded.append((n, total)),
+                chunk_size=1024)
+
+        self.assertEqual(uploaded[-1], (len(img), len(img)))
+        self.assertEqual(downloaded[-1][0], len(img))
+        self.assertGreater(len(downloaded), 1)
+
+        converted = CvBridge().imgmsg_to_cv2(msg)
+        self.assertTrue((np.asarray(converted) == nparr).all())
+
 
 if __name__ == "__main__":
     rospy.init_node("test_client")
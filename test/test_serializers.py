@@ -3,7 +3,10 @@
 
 """Interoperability Serialization Tests."""
 
+import gc
+import cv2
 import utm
+import time
 import rospy
 import rosunit
 import numpy as np
@@ -11,11 +14,41 @@ from unittest import TestCase
 from cv_bridge import CvBridge
 from interop import serializers
 from std_msgs.msg import Float64
-from sensor_msgs.msg import NavSatFix
+from sensor_msgs.msg import CompressedImage, NavSatFix
 from visualization_msgs.msg import Marker
 from interop.msg import Color, Orientation, Shape, Target, TargetType
 
 
+def legacy_image_from_msg(msg):
+    """Previous image serialization, kept as a benchmark baseline.
+
+    Args:
+        msg: ROS Image message.
+
+    Returns:
+        Compressed PNG image.
+    """
+    bridge = CvBridge()
+    img = bridge.imgmsg_to_cv2(msg)
+    return cv2.imencode(".png", img, [cv2.IMWRITE_PNG_COMPRESSION, 9])[1] \
+        .tostring()
+
+
+def legacy_image_from_raw(raw):
+    """Previous image deserialization, kept as a benchmark baseline.
+
+    Args:
+        raw: Binary encoded image data.
+
+    Returns:
+        ROS Image message.
+    """
+    nparr = np.fromstring(raw, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    bridge = CvBridge()
+    return bridge.cv2_to_imgmsg(img)
+
+
 class TestSerializers(TestCase):
 
     """Tests interoperability serializers."""
@@ -110,8 +143,8 @@ class TestSerializers(TestCase):
                     bound[k]["latitude"],
                     bound[k]["longitude"])
 
-                self.assertEqual(pnt.x, easting)
-                self.assertEqual(pnt.y, northing)
+                self.assertAlmostEqual(pnt.x, easting, places=6)
+                self.assertAlmostEqual(pnt.y, northing, places=6)
 
         # Test search grid.
         grid = data["search_grid_points"]
@@ -124,8 +157,8 @@ class TestSerializers(TestCase):
                 grid[i]["latitude"],
                 grid[i]["longitude"])
 
-            self.assertEqual(pnt.x, easting)
-            self.assertEqual(pnt.y, northing)
+            self.assertAlmostEqual(pnt.x, easting, places=6)
+            self.assertAlmostEqual(pnt.y, northing, places=6)
             self.assertEqual(pnt.z, altitude)
 
         # Test waypoints.
@@ -140,31 +173,111 @@ class TestSerializers(TestCase):
                 points[i]["latitude"],
                 points[i]["longitude"])
 
-            self.assertEqual(pnt.x, easting)
-            self.assertEqual(pnt.y, northing)
+            self.assertAlmostEqual(pnt.x, easting, places=6)
+            self.assertAlmostEqual(pnt.y, northing, places=6)
             self.assertEqual(pnt.z, altitude)
 
         # Test airdrop pos.
         easting, northing, _, _ = utm.from_latlon(
             data["air_drop_pos"]["latitude"],
             data["air_drop_pos"]["longitude"])
-        self.assertEqual(air_drop_pos.point.x, easting)
-        self.assertEqual(air_drop_pos.point.y, northing)
+        self.assertAlmostEqual(air_drop_pos.point.x, easting, places=6)
+        self.assertAlmostEqual(air_drop_pos.point.y, northing, places=6)
 
         # Test off axis target.
         easting, northing, _, _ = utm.from_latlon(
             data["off_axis_target_pos"]["latitude"],
             data["off_axis_target_pos"]["longitude"])
-        self.assertEqual(off_axis_targ.point.x, easting)
-        self.assertEqual(off_axis_targ.point.y, northing)
+        self.assertAlmostEqual(off_axis_targ.point.x, easting, places=6)
+        self.assertAlmostEqual(off_axis_targ.point.y, northing, places=6)
 
         # Test emergent object.
         easting, northing, _, _ = utm.from_latlon(
             data["emergent_last_known_pos"]["latitude"],
             data["emergent_last_known_pos"]["longitude"])
-        self.assertEqual(emergent_obj.point.x, easting)
-        self.assertEqual(emergent_obj.point.y, northing)
-
+        self.assertAlmostEqual(emergent_obj.point.x, easting, places=6)
+        self.assertAlmostEqual(emergent_obj.point.y, northing, places=6)
+
+        # Lazy missions only deserialize the fields that are accessed.
+        lazy = serializers.MissionDeserializer.from_dict_lazy(data, "map")
+        self.assertEqual(len(lazy), 6)
+        self.assertEqual(lazy._fields, {})
+        self.assertEqual(lazy.waypoints.points, waypoints.points)
+        self.assertIs(lazy[2], lazy.waypoints)
+        self.assertEqual(list(lazy._fields), [2])
+
+        # And can be unpacked like the tuple.
+        lazy_fields = tuple(lazy)
+        self.assertEqual(lazy_fields[3].point, air_drop_pos.point)
+        self.assertEqual(lazy_fields[1].polygon, search_grid.polygon)
+
+        # Negative indices and slices behave as with tuples.
+        self.assertIs(lazy[-1], lazy_fields[5])
+        self.assertIs(lazy[-4], lazy.waypoints)
+        self.assertEqual(lazy[1:3], lazy_fields[1:3])
+        self.assertEqual(lazy[::-1], lazy_fields[::-1])
+        with self.assertRaises(IndexError):
+            lazy[6]
+
+    def test_latlon_to_utm(self):
+        """Tests batched UTM conversion against the utm package."""
+        latitudes = [38.142544, 38.141833, -33.856159, 64.135338]
+        longitudes = [-76.434088, -76.425263, 151.215256, -21.895210]
+
+        for latitude, longitude in zip(latitudes, longitudes):
+            expected = utm.from_latlon(latitude, longitude)
+            projection = serializers.UTMProjection.from_latlon(latitude,
+                                                               longitude)
+            eastings, northings = projection.project_points(
+                [{"latitude": latitude, "longitude": longitude}])
+            self.assertAlmostEqual(eastings[0], expected[0], places=6)
+            self.assertAlmostEqual(northings[0], expected[1], places=6)
+            self.assertEqual(projection.zone_number, expected[2])
+
+        # Points straddling a zone boundary are projected in the same zone.
+        projection = serializers.UTMProjection.from_latlon(45.0, -78.001)
+        eastings, northings = projection.project_points([
+            {"latitude": 45.0, "longitude": -78.001},
+            {"latitude": 45.0, "longitude": -77.999}
+        ])
+        self.assertEqual(projection.zone_number, 17)
+        self.assertGreater(eastings[1], eastings[0])
+
+        expected = utm.from_latlon(45.0, -77.999, force_zone_number=17)
+        self.assertAlmostEqual(eastings[1], expected[0], places=6)
+        self.assertAlmostEqual(northings[1], expected[1], places=6)
+
+    def test_utm_projection(self):
+        """Tests the UTM projection with and without a local origin."""
+        latitudes = [38.142544, 38.141833, 38.144678]
+        longitudes = [-76.434088, -76.425263, -76.427995]
+
+        projection = serializers.UTMProjection(18)
+        local = serializers.UTMProjection.from_latlon(38.14792, -76.427995,
+                                                      local=True)
+        self.assertEqual(local.zone_number, 18)
+
+        eastings, northings = projection.project(latitudes, longitudes)
+        local_eastings, local_northings = local.project(latitudes, longitudes)
+        (origin_easting,), (origin_northing,) = projection.project(
+            [38.14792], [-76.427995])
+
+        for i in range(len(latitudes)):
+            self.assertAlmostEqual(eastings[i] - origin_easting,
+                                   local_eastings[i], places=6)
+            self.assertAlmostEqual(northings[i] - origin_northing,
+                                   local_northings[i], places=6)
+
+            # Local coordinates are within a few kilometers of the origin.
+            self.assertLess(abs(local_eastings[i]), 2000)
+            self.assertLess(abs(local_northings[i]), 2000)
+
+        # Points across the equator are projected in the same hemisphere.
+        equator = serializers.UTMProjection.from_latlon(0.001, 9.0)
+        self.assertTrue(equator.northern)
+        _, northings = equator.project([0.001, -0.001], [9.0, 9.0])
+        self.assertAlmostEqual(northings[0], -northings[1], places=3)
+        self.assertLess(northings[0] - northings[1], 300)
 
     def test_obstacles_deserializer(self):
         """Tests obstacles deserializer."""
@@ -218,8 +331,8 @@ class TestSerializers(TestCase):
             altitude = serializers.feet_to_meters(obs["altitude_msl"])
             easting, northing, _, _ = utm.from_latlon(obs["latitude"],
                                                       obs["longitude"])
-            self.assertEqual(marker.pose.position.x, easting)
-            self.assertEqual(marker.pose.position.y, northing)
+            self.assertAlmostEqual(marker.pose.position.x, easting, places=6)
+            self.assertAlmostEqual(marker.pose.position.y, northing, places=6)
             self.assertEqual(marker.pose.position.z, altitude)
 
             radius = serializers.feet_to_meters(obs["sphere_radius"])
@@ -236,8 +349,8 @@ class TestSerializers(TestCase):
             height = serializers.feet_to_meters(obs["cylinder_height"])
             easting, northing, _, _ = utm.from_latlon(obs["latitude"],
                                                       obs["longitude"])
-            self.assertEqual(marker.pose.position.x, easting)
-            self.assertEqual(marker.pose.position.y, northing)
+            self.assertAlmostEqual(marker.pose.position.x, easting, places=6)
+            self.assertAlmostEqual(marker.pose.position.y, northing, places=6)
             self.assertEqual(marker.pose.position.z, height / 2)
 
             radius = serializers.feet_to_meters(obs["cylinder_radius"])
@@ -245,6 +358,93 @@ class TestSerializers(TestCase):
             self.assertEqual(marker.scale.y, radius)
             self.assertEqual(marker.scale.z, height)
 
+    def make_obstacles(self, count):
+        """Generates obstacle data.
+
+        Args:
+            count (int): Number of obstacles of each kind.
+
+        Returns:
+            A dictionary.
+        """
+        return {
+            "moving_obstacles": [{
+                "altitude_msl": 200.0 + i,
+                "latitude": 38.14 + i * 1e-4,
+                "longitude": -76.43 + i * 1e-4,
+                "sphere_radius": 150.0
+            } for i in range(count)],
+            "stationary_obstacles": [{
+                "cylinder_height": 750.0,
+                "cylinder_radius": 300.0 + i,
+                "latitude": 38.14 - i * 1e-4,
+                "longitude": -76.43 - i * 1e-4
+            } for i in range(count)]
+        }
+
+    def test_obstacles_deserializer_reuse(self):
+        """Tests the obstacles deserializer reuses its markers."""
+        deserializer = serializers.ObstaclesDeserializer("odom", 1.0, 0)
+
+        moving, stationary = deserializer.deserialize(self.make_obstacles(3))
+        markers = moving.markers + stationary.markers
+        self.assertEqual(len(moving.markers), 3)
+        self.assertEqual([m.id for m in moving.markers], [0, 1, 2])
+        self.assertEqual(stationary.markers[0].lifetime, rospy.Duration())
+
+        # Fewer obstacles reuse the same markers with the new values.
+        data = self.make_obstacles(2)
+        data["moving_obstacles"][0]["altitude_msl"] = 100.0
+        moving, stationary = deserializer.deserialize(data)
+        self.assertEqual(len(moving.markers), 2)
+        self.assertEqual(len(stationary.markers), 2)
+        self.assertIs(moving.markers[0], markers[0])
+        self.assertIs(stationary.markers[1], markers[4])
+        self.assertEqual(moving.markers[0].pose.position.z,
+                         serializers.feet_to_meters(100.0))
+
+        # Results match those of new markers.
+        expected, _ = serializers.ObstaclesDeserializer.from_dict(
+            data, "odom", 1.0)
+        for marker, expected_marker in zip(moving.markers, expected.markers):
+            self.assertEqual(marker.pose, expected_marker.pose)
+            self.assertEqual(marker.scale, expected_marker.scale)
+
+        # More obstacles only allocate the missing markers.
+        moving, _ = deserializer.deserialize(self.make_obstacles(4))
+        self.assertEqual(moving.markers[:3], markers[:3])
+        self.assertEqual(moving.markers[3].id, 3)
+
+    def test_obstacles_deserializer_allocations(self):
+        """Benchmarks markers allocated per obstacles deserialization."""
+        def count_markers():
+            gc.collect()
+            return sum(1 for o in gc.get_objects() if isinstance(o, Marker))
+
+        count = 100
+        data = self.make_obstacles(count)
+        deserializer = serializers.ObstaclesDeserializer("odom", 1.0)
+        implementations = (
+            ("from_dict", lambda: serializers.ObstaclesDeserializer
+                .from_dict(data, "odom", 1.0)),
+            ("pooled", lambda: deserializer.deserialize(data)),
+        )
+
+        results = {}
+        for name, deserialize in implementations:
+            # Warm up, so that the pool is filled.
+            deserialize()
+
+            # Keep every result alive, so that new markers are all counted.
+            before = count_markers()
+            kept = [deserialize() for _ in range(20)]
+            results[name] = count_markers() - before
+            rospy.loginfo("%s: %d markers allocated in %d calls with %d "
+                          "obstacles", name, results[name], len(kept), count)
+
+        self.assertEqual(results["from_dict"], 20 * 2 * count)
+        self.assertEqual(results["pooled"], 0)
+
     def test_telemetry_serializer(self):
         """Tests telemetry serializer."""
         # Set up test data.
@@ -354,6 +554,97 @@ class TestSerializers(TestCase):
         # Test if we get the original image.
         self.assertTrue((converted_arr == nparr).all())
 
+    def test_target_image_serializer_reuse(self):
+        """Tests a serializer instance can be reused across images."""
+        serializer = serializers.TargetImageSerializer(compression=1)
+        bridge = CvBridge()
+
+        for _ in range(3):
+            nparr = np.random.randint(0, 256, (30, 40, 3)).astype(np.uint8)
+            png = serializer.serialize(bridge.cv2_to_imgmsg(nparr))
+
+            # Buffers such as bytearrays are decoded without a copy.
+            converted_msg = serializer.deserialize(bytearray(png))
+            converted_arr = np.asarray(bridge.imgmsg_to_cv2(converted_msg))
+            self.assertTrue((converted_arr == nparr).all())
+
+    def test_target_image_recompression(self):
+        """Tests images can be recompressed without loss."""
+        nparr = np.random.randint(0, 256, (30, 40, 3)).astype(np.uint8)
+        bridge = CvBridge()
+        fast = serializers.TargetImageSerializer(compression=1)
+        small = serializers.TargetImageSerializer(compression=9)
+
+        png = small.recompress(fast.serialize(bridge.cv2_to_imgmsg(nparr)))
+
+        converted_arr = np.asarray(bridge.imgmsg_to_cv2(small.deserialize(png)))
+        self.assertTrue((converted_arr == nparr).all())
+
+        with self.assertRaises(ValueError):
+            small.recompress("not an image")
+
+    def test_compressed_target_image_serializer(self):
+        """Tests compressed images pass through the serializer as is."""
+        nparr = np.random.randint(0, 256, (30, 40, 3)).astype(np.uint8)
+        serializer = serializers.CompressedTargetImageSerializer
+
+        for format in ("png", "jpeg"):
+            raw = cv2.imencode("." + format, nparr)[1].tobytes()
+            msg = CompressedImage(format="bgr8; {} compressed bgr8".format(
+                format), data=raw)
+
+            # Serialize.
+            data, serialized_format = serializer.from_msg(msg)
+            self.assertEqual(data, raw)
+            self.assertEqual(serialized_format, format)
+
+            # Deserialize.
+            converted_msg = serializer.from_raw(data)
+            self.assertEqual(converted_msg.format, format)
+            self.assertEqual(converted_msg.data, raw)
+
+            # JPEG images are not recompressed.
+            recompressed = serializers.TargetImageSerializer().recompress(raw)
+            self.assertEqual(recompressed == raw, format == "jpeg")
+
+        with self.assertRaises(ValueError):
+            serializer.from_msg(CompressedImage(format="bmp", data="BM"))
+        with self.assertRaises(ValueError):
+            serializer.from_raw("BM")
+
+    def test_target_image_serializer_benchmark(self):
+        """Benchmarks image round trips of 4K frame crops."""
+        n = 20
+        crop = 256
+
+        # Smooth gradient 4K frame, closer to a camera image than noise.
+        xs = np.linspace(0, 255, 3840).astype(np.uint8)
+        frame = np.dstack([np.tile(xs, (2160, 1))] * 3)
+        frame[::2, ::3] = 255
+        bridge = CvBridge()
+        crops = []
+        for i in range(n):
+            y = (i * 97) % (2160 - crop)
+            x = (i * 191) % (3840 - crop)
+            crops.append(bridge.cv2_to_imgmsg(
+                np.ascontiguousarray(frame[y:y + crop, x:x + crop])))
+
+        serializer = serializers.TargetImageSerializer()
+        implementations = (
+            ("legacy", legacy_image_from_msg, legacy_image_from_raw),
+            ("reused", serializer.serialize, serializer.deserialize),
+        )
+        for name, from_msg, from_raw in implementations:
+            start = time.time()
+            for msg in crops:
+                converted_msg = from_raw(from_msg(msg))
+            elapsed = time.time() - start
+
+            rospy.loginfo("%s: %.2f ms per %dx%d crop, %.1f images/s",
+                          name, 1e3 * elapsed / n, crop, crop, n / elapsed)
+            self.assertEqual(converted_msg.width, crop)
+            self.assertEqual(converted_msg.height, crop)
+
 
 if __name__ == "__main__":
     rospy.init_node("test_serializers")
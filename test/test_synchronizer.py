@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Test interop.telemetry.UnstampedTimeSynchronizer."""
+
+import time
+import rospy
+import rosunit
+import unittest
+import itertools
+import message_filters
+from std_msgs.msg import Float64
+from sensor_msgs.msg import NavSatFix
+from interop.telemetry import UnstampedTimeSynchronizer
+
+
+class ProductTimeSynchronizer(message_filters.ApproximateTimeSynchronizer):
+
+    """Previous Cartesian product based implementation, kept as a benchmark
+    baseline.
+    """
+
+    def add(self, msg, my_queue, my_queue_index=None):
+        """Adds a message to the current queue, and matches them accordingly.
+
+        Args:
+            msg: Message.
+            my_queue: Current message queue map from ROS Time to ROS message.
+            my_queue_index: Unused.
+        """
+        received = rospy.get_rostime()
+
+        with self.lock:
+            my_queue[received] = msg
+            while len(my_queue) > self.queue_size:
+                del my_queue[min(my_queue)]
+
+            for vv in itertools.product(*[list(q.keys()) for q in self.queues]):
+                qt = list(zip(self.queues, vv))
+                if (((max(vv) - min(vv)) < self.slop) and
+                        (len([1 for q, t in qt if t not in q]) == 0)):
+                    msgs = [q[t] for q, t in qt]
+                    self.signalMessage(*msgs)
+                    for q, t in qt:
+                        del q[t]
+
+
+class TestUnstampedTimeSynchronizer(unittest.TestCase):
+
+    """Tests the arrival order synchronizer."""
+
+    def make_synchronizer(self, cls, queue_size, slop):
+        """Creates a synchronizer fed by two bare filters.
+
+        Args:
+            cls: Synchronizer class.
+            queue_size (int): Synchronizer queue size.
+            slop (float): Maximum delay in seconds between matched messages.
+
+        Returns:
+            Tuple of (synchronizer, filters, matches), where matches is the
+            list of matched message pairs.
+        """
+        filters = [message_filters.SimpleFilter(),
+                   message_filters.SimpleFilter()]
+        synchronizer = cls(filters, queue_size, slop)
+
+        matches = []
+        synchronizer.registerCallback(lambda *msgs: matches.append(msgs))
+
+        return synchronizer, filters, matches
+
+    def test_matches_in_order(self):
+        """Tests that alternating messages are matched in arrival order."""
+        _, filters, matches = self.make_synchronizer(
+            UnstampedTimeSynchronizer, 10, 1.0)
+
+        for i in range(5):
+            filters[0].signalMessage(NavSatFix(latitude=i))
+            filters[1].signalMessage(Float64(i))
+
+        self.assertEqual(len(matches), 5)
+        for i, (navsat, compass) in enumerate(matches):
+            self.assertEqual(navsat.latitude, i)
+            self.assertEqual(compass.data, i)
+
+    def test_drops_stale_messages(self):
+        """Tests that messages older than the allowed delay are dropped."""
+        _, filters, matches = self.make_synchronizer(
+            UnstampedTimeSynchronizer, 10, 0.05)
+
+        filters[0].signalMessage(NavSatFix(latitude=0))
+        time.sleep(0.1)
+        filters[0].signalMessage(NavSatFix(latitude=1))
+        filters[1].signalMessage(Float64(1))
+
+        self.assertEqual(len(matches), 1)
+        self.assertEqual(matches[0][0].latitude, 1)
+
+    def test_matches_newest(self):
+        """Tests that the closest pair is matched when the inputs run at
+        different rates, rather than the oldest pair within the delay."""
+        _, filters, matches = self.make_synchronizer(
+            UnstampedTimeSynchronizer, 10, 1.0)
+
+        for i in range(5):
+            filters[0].signalMessage(NavSatFix(latitude=i))
+            time.sleep(0.01)
+        filters[1].signalMessage(Float64(4))
+
+        self.assertEqual(len(matches), 1)
+        self.assertEqual(matches[0][0].latitude, 4)
+        self.assertEqual(matches[0][1].data, 4)
+
+    def test_queue_size(self):
+        """Tests that each queue is bounded."""
+        synchronizer, filters, matches = self.make_synchronizer(
+            UnstampedTimeSynchronizer, 3, 1.0)
+
+        for i in range(10):
+            filters[0].signalMessage(NavSatFix(latitude=i))
+
+        self.assertEqual(len(matches), 0)
+        self.assertEqual([m.latitude for _, m in synchronizer._deques[0]],
+                         [7, 8, 9])
+
+    def test_benchmark(self):
+        """Benchmarks against the Cartesian product implementation."""
+        n = 2000
+        queue_size = 50
+
+        for cls in (ProductTimeSynchronizer, UnstampedTimeSynchronizer):
+            _, filters, matches = self.make_synchronizer(cls, queue_size, 1.0)
+
+            # Bursty input: navsat runs ahead of the compass to fill queues.
+            start = time.time()
+            for i in range(n):
+                filters[0].signalMessage(NavSatFix(latitude=i))
+                if i % 2:
+                    filters[1].signalMessage(Float64())
+                    filters[1].signalMessage(Float64())
+            elapsed = time.time() - start
+
+            rospy.loginfo("%s: %.1f us per message, %d matches",
+                          cls.__name__, 1e6 * elapsed / (2 * n), len(matches))
+
+        # Only the first navsat message is dropped, for the newer one that
+        # arrived before the first compass message.
+        self.assertEqual([navsat.latitude for navsat, _ in matches],
+                         list(range(1, n)))
+
+if __name__ == "__main__":
+    rospy.init_node("test_synchronizer")
+    rosunit.unitrun("test_synchronizer", "test_synchronizer",
+                    TestUnstampedTimeSynchronizer)
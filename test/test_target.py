@@ -95,6 +95,23 @@ class TestTarget(unittest.TestCase):
         """Tests the retrieval of a Target."""
         self.assertEqual(json.loads(self.target.get()), self.target_data)
 
+    def test_get_target_is_cached(self):
+        """Tests that retrieving a Target does not read the file again."""
+        # Overwrite the file behind the target's back.
+        with open(os.path.join(self.targets_dir, "1.json"), "w") as f:
+            f.write("{}")
+
+        self.assertEqual(json.loads(self.target.get()), self.target_data)
+
+        # Writes must still go to disk.
+        updated_target = self.target_data.copy()
+        updated_target["shape"] = "circle"
+        self.target.update(json.dumps(updated_target))
+
+        with open(os.path.join(self.targets_dir, "1.json"), "r") as f:
+            self.assertEqual(json.loads(f.read()), updated_target)
+        self.assertEqual(json.loads(self.target.get()), updated_target)
+
     def test_update_target(self):
         """Tests that updating of a Target."""
         # Update target
@@ -129,6 +146,19 @@ class TestTarget(unittest.TestCase):
 
         self.assertEqual(saved_image, image)
 
+    def test_set_image_format(self):
+        """Tests that images are stored according to their format, and that
+        only the latest image is kept."""
+        jpeg = "\xff\xd8\xff\xe0 not really a JPEG image"
+        self.target.set_image(generate_image())
+        self.target.set_image(jpeg, "jpeg")
+
+        self.assertFalse(os.path.exists(os.path.join(self.targets_dir,
+                                                     "1.png")))
+        with open(os.path.join(self.targets_dir, "1.jpeg"), "rb") as f:
+            self.assertEqual(f.read(), jpeg)
+        self.assertEqual(self.target.get_image(), jpeg)
+
     def test_get_image(self):
         """Tests the retrieval of an image associated with a Target."""
         image = generate_image()
@@ -136,6 +166,19 @@ class TestTarget(unittest.TestCase):
 
         self.assertEqual(self.target.get_image(), image)
 
+    def test_open_image(self):
+        """Tests streaming an image from disk while it is being replaced."""
+        image = generate_image()
+        self.target.set_image(image)
+
+        f = self.target.open_image()
+        try:
+            # Replacing the image must not affect the open file.
+            self.target.set_image(generate_image())
+            self.assertEqual(f.read(), image)
+        finally:
+            f.close()
+
     def test_delete_image(self):
         """Tests the deletion of an image."""
         self.target.set_image(generate_image())  # Set an image.
@@ -441,6 +484,39 @@ class TestTarget(unittest.TestCase):
                 self.assertFalse(self.target._image_needs_setting)
                 self.assertFalse(self.target._image_needs_deleting)
 
+    def test_transcoded_image_sync(self):
+        """Tests that images are transcoded right before being uploaded."""
+        transcoded = []
+
+        def transcode(raw):
+            transcoded.append(raw)
+            return "transcoded"
+
+        target = Target(self.targets_dir, 2, json.dumps(self.target_data),
+                        self.client, transcode=transcode)
+        image = generate_image()
+        target.set_image(image)
+
+        # Nothing is transcoded when the image is set.
+        self.assertEqual(transcoded, [])
+
+        with InteroperabilityMockServer("http://interop") as server:
+            # Setup mock server.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_post_target_response(self.target_data, 1)
+            server.set_post_target_image_response(1)
+
+            self.client.wait_for_server()
+            self.client.login()
+            target.sync()
+
+            self.assertEqual(server.rsps.calls[-1].request.body, "transcoded")
+
+        self.assertEqual(transcoded, [image])
+        self.assertTrue(target.image_is_on_server)
+        self.assertFalse(target._image_needs_setting)
+
     def test_state_variables_after_unsuccessful_image_sync(self):
         """Tests that the state variables reflect unsuccessful target image
         syncs.
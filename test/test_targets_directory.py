@@ -7,10 +7,14 @@ import unittest
 import shutil
 import os
 import os.path
+import json
+import time
 import rospy
+import threading
 import rosunit
 from interop.client import InteroperabilityClient
 from interop.local_targets import TargetsDirectory
+from mock_server import InteroperabilityMockServer
 
 
 class TestTargetsDirectory(unittest.TestCase):
@@ -31,6 +35,13 @@ class TestTargetsDirectory(unittest.TestCase):
         self.targets_root = "/tmp/targets_root"
         self.targets_directory = TargetsDirectory(self.targets_root, self.client)
 
+        # Set up the target used by the sync tests.
+        self.target_data = {
+            "type": "standard",
+            "latitude": 38.1478,
+            "longitude": -76.4275
+        }
+
     def tearDown(self):
         """Cleans up after each test. Removes the targets root directory."""
         shutil.rmtree(self.targets_root)
@@ -53,6 +64,149 @@ class TestTargetsDirectory(unittest.TestCase):
         # Test that the path pointed to by the symlink is a directory.
         self.assertTrue(os.path.isdir(directory_path))
 
+    def test_sync(self):
+        """Tests that all targets are synced concurrently."""
+        file_ids = [
+            self.targets_directory.add_target(json.dumps(self.target_data))
+            for _ in range(8)
+        ]
+
+        with InteroperabilityMockServer("http://interop") as server:
+            # Setup mock server.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_post_target_response(self.target_data, 1)
+
+            self.client.wait_for_server()
+            self.client.login()
+            duration = self.targets_directory.sync()
+
+        # Check that every target was added.
+        for file_id in file_ids:
+            target = self.targets_directory.targets[file_id]
+            self.assertFalse(target.needs_adding)
+            self.assertEqual(target.interop_id, 1)
+
+        # Check that the sync latency was recorded.
+        self.assertEqual(duration, self.targets_directory.last_sync_duration)
+        self.assertGreaterEqual(duration, 0)
+
+    def test_sync_only_visits_dirty_targets(self):
+        """Tests that syncs only visit targets that changed."""
+        file_ids = [
+            self.targets_directory.add_target(json.dumps(self.target_data))
+            for _ in range(3)
+        ]
+        targets = [self.targets_directory.targets[i] for i in file_ids]
+        self.assertEqual(self.targets_directory.dirty, set(targets))
+
+        with InteroperabilityMockServer("http://interop") as server:
+            # Setup mock server.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_post_target_response(self.target_data, 1)
+
+            self.client.wait_for_server()
+            self.client.login()
+            self.targets_directory.sync()
+
+        # Nothing left to sync.
+        self.assertEqual(self.targets_directory.dirty, set())
+
+        # Only the updated target should be synced next.
+        self.targets_directory.update_target(file_ids[1],
+                                             json.dumps(self.target_data))
+        self.assertEqual(self.targets_directory.dirty, {targets[1]})
+
+        # Add and delete a target locally before it is ever synced.
+        file_id = self.targets_directory.add_target(
+            json.dumps(self.target_data))
+        self.targets_directory.delete_target(file_id)
+
+        with InteroperabilityMockServer("http://interop") as server:
+            # Setup mock server to fail the update.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_put_target_response(1, self.target_data, code=500)
+
+            self.client.wait_for_server()
+            self.client.login()
+            self.targets_directory.sync()
+
+        # Failed syncs are retried, and the deleted target is forgotten.
+        self.assertEqual(self.targets_directory.dirty, {targets[1]})
+        self.assertNotIn(file_id, self.targets_directory.targets)
+
+    def test_calls_do_not_wait_on_sync(self):
+        """Tests that local calls stay fast while a slow sync is in flight."""
+        file_id = self.targets_directory.add_target(
+            json.dumps(self.target_data))
+
+        with InteroperabilityMockServer("http://interop") as server:
+            # Setup a slow mock server.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_post_target_response(self.target_data, 1, delay=1.0)
+
+            self.client.wait_for_server()
+            self.client.login()
+
+            sync = threading.Thread(target=self.targets_directory.sync)
+            sync.start()
+            time.sleep(0.2)  # Let the upload start.
+
+            # Time local calls while the upload is in flight, including on
+            # the target being uploaded.
+            latencies = []
+            for call, args in [
+                    (self.targets_directory.add_target,
+                     (json.dumps(self.target_data),)),
+                    (self.targets_directory.update_target,
+                     (file_id, json.dumps(self.target_data))),
+                    (self.targets_directory.get_target, (file_id,)),
+                    (self.targets_directory.get_all_targets, ())]:
+                start = time.time()
+                call(*args)
+                latencies.append(time.time() - start)
+
+            self.assertTrue(sync.is_alive())
+            sync.join()
+
+        for latency in latencies:
+            self.assertLess(latency, 0.05)
+
+        # The update made during the upload must still be synced.
+        target = self.targets_directory.targets[file_id]
+        self.assertFalse(target.needs_adding)
+        self.assertTrue(target.needs_updating)
+
+    def test_event_driven_sync(self):
+        """Tests that changes are synced right away by the sync worker."""
+        with InteroperabilityMockServer("http://interop") as server:
+            # Setup mock server.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_post_target_response(self.target_data, 1)
+
+            self.client.wait_for_server()
+            self.client.login()
+
+            self.targets_directory.start_sync_worker(debounce=0.01)
+            try:
+                start = time.time()
+                file_id = self.targets_directory.add_target(
+                    json.dumps(self.target_data))
+                target = self.targets_directory.targets[file_id]
+
+                while target.interop_id is None and time.time() - start < 5:
+                    time.sleep(0.001)
+                latency = time.time() - start
+            finally:
+                self.targets_directory.stop_sync_worker()
+
+        self.assertEqual(target.interop_id, 1)
+        self.assertLess(latency, 0.5)
+
 
 if __name__ == "__main__":
     rospy.init_node("test_local_targets")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Test interop.telemetry.TelemetryUploader."""
+
+import time
+import rospy
+import rosunit
+import unittest
+from std_msgs.msg import Float64
+from sensor_msgs.msg import NavSatFix
+from interop.client import InteroperabilityClient
+from interop.telemetry import TelemetryUploader
+from mock_server import InteroperabilityMockServer
+
+
+class TestTelemetryUploader(unittest.TestCase):
+
+    """Tests the background telemetry uploader."""
+
+    def setUp(self):
+        """Sets up the client."""
+        self.client = InteroperabilityClient("http://interop", "testuser",
+            "testpass", 1.0)
+
+    def wait_until(self, predicate, timeout=5.0):
+        """Waits until the predicate is true or the timeout expires.
+
+        Args:
+            predicate: Callable returning a bool.
+            timeout (float): Maximum time to wait in seconds.
+
+        Returns:
+            The last value returned by the predicate.
+        """
+        end = time.time() + timeout
+        while not predicate() and time.time() < end:
+            time.sleep(0.01)
+        return predicate()
+
+    def test_latest_wins(self):
+        """Tests that the oldest samples are dropped when the queue is full."""
+        uploader = TelemetryUploader(self.client, queue_size=2)
+
+        for _ in range(5):
+            uploader.put(NavSatFix(), Float64())
+
+        self.assertEqual(uploader.depth, 2)
+        self.assertEqual(uploader.dropped, 3)
+
+    def test_upload(self):
+        """Tests that queued samples are uploaded by the worker."""
+        uploader = TelemetryUploader(self.client, queue_size=1)
+
+        with InteroperabilityMockServer("http://interop") as server:
+            # Setup mock server.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_telemetry_response()
+
+            self.client.wait_for_server()
+            self.client.login()
+
+            uploader.start()
+            try:
+                uploader.put(NavSatFix(), Float64())
+                self.assertTrue(self.wait_until(lambda: uploader.uploaded))
+            finally:
+                uploader.stop()
+
+        stats = uploader.stats()
+        self.assertEqual(stats["uploaded"], 1)
+        self.assertEqual(stats["failed"], 0)
+        self.assertEqual(stats["dropped"], 0)
+        self.assertEqual(stats["depth"], 0)
+        self.assertGreater(stats["rate"], 0)
+
+    def test_failed_upload(self):
+        """Tests that failed uploads are counted and do not stop the worker."""
+        uploader = TelemetryUploader(self.client, queue_size=1)
+
+        with InteroperabilityMockServer("http://interop") as server:
+            # Setup mock server.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_telemetry_response(code=500)
+
+            self.client.wait_for_server()
+            self.client.login()
+
+            uploader.start()
+            try:
+                uploader.put(NavSatFix(), Float64())
+                self.assertTrue(self.wait_until(lambda: uploader.failed))
+            finally:
+                uploader.stop()
+
+        self.assertEqual(uploader.uploaded, 0)
+        self.assertEqual(uploader.failed, 1)
+
+    def test_unexpected_error(self):
+        """Tests that unexpected errors are counted and do not stop the
+        worker."""
+        uploader = TelemetryUploader(self.client, queue_size=1)
+        post_telemetry = self.client.post_telemetry
+        calls = []
+
+        def fail_once(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise KeyError("unexpected")
+            return post_telemetry(*args)
+
+        self.client.post_telemetry = fail_once
+
+        with InteroperabilityMockServer("http://interop") as server:
+            # Setup mock server.
+            server.set_root_response()
+            server.set_login_response()
+            server.set_telemetry_response()
+
+            self.client.wait_for_server()
+            self.client.login()
+
+            uploader.start()
+            try:
+                uploader.put(NavSatFix(), Float64())
+                self.assertTrue(self.wait_until(lambda: uploader.failed))
+
+                uploader.put(NavSatFix(), Float64())
+                self.assertTrue(self.wait_until(lambda: uploader.uploaded))
+            finally:
+                uploader.stop()
+
+        self.assertEqual(uploader.uploaded, 1)
+        self.assertEqual(uploader.failed, 1)
+
+
+if __name__ == "__main__":
+    rospy.init_node("test_telemetry")
+    rosunit.unitrun("test_telemetry", "test_telemetry", TestTelemetryUploader)